@@ -0,0 +1,273 @@
+"""
+Offline benchmark of the update pipeline.
+
+Feeds synthetic (or recorded) updates through the real Dispatcher from
+main.create_dispatcher(), with a stubbed Bot API session and a throwaway
+SQLite database, and reports overall throughput and mean/p50/p99 latency per update type.
+
+    python bench.py                          # 1000 updates of every type
+    python bench.py -n 5000 --types text,link
+    python bench.py --replay updates.jsonl   # raw Update JSON, one per line
+    python bench.py --out new.json --compare old.json
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+
+import aiogram
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, GetChatAdministrators, SendMessage
+from aiogram.types import (
+    CallbackQuery, Chat, ChatMemberLeft, ChatMemberMember, ChatMemberOwner,
+    ChatMemberUpdated, Message, MessageEntity, Update, User,
+)
+
+from database import manager
+from database.manager import init_db, pool
+from database.stats_buffer import stats_buffer
+from handlers import events
+from main import create_dispatcher
+from utils.logger import log_dispatcher
+from utils.raid_detector import raid_detector
+from utils.scheduler import scheduler
+
+UPDATE_TYPES = ("text", "banned_word", "link", "command", "callback", "join")
+BENCH_CHATS = 20
+BENCH_USERS = 200
+OWNER_ID = 1
+BANNED_WORD = "spamword"
+
+class StubSession(BaseSession):
+    """Answers every Bot API call locally, counting them instead of sending anything."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self._ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return Message(
+                message_id=next(self._ids), date=datetime.datetime.now(),
+                chat=Chat(id=method.chat_id or 0, type="supergroup"), text=method.text,
+            )
+        if isinstance(method, GetChatAdministrators):
+            return [ChatMemberOwner(user=User(id=OWNER_ID, is_bot=False, first_name="Owner"), is_anonymous=False)]
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+class UpdateFactory:
+    """Synthetic updates spread over BENCH_CHATS chats and BENCH_USERS senders."""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._joiners = itertools.count(10_000_000)
+
+    def message(self, chat_id: int, user_id: int, text: str, entities=None) -> Update:
+        user = User(id=user_id, is_bot=False, first_name=f"user{user_id}", username=f"user{user_id}")
+        message = Message(
+            message_id=next(self._message_ids), date=datetime.datetime.now(),
+            chat=Chat(id=chat_id, type="supergroup"), from_user=user, text=text, entities=entities,
+        )
+        return Update(update_id=next(self._update_ids), message=message)
+
+    def make(self, kind: str, i: int) -> Update:
+        chat_id = -1000 - i % BENCH_CHATS
+        user_id = 100 + i % BENCH_USERS
+        if kind == "text":
+            return self.message(chat_id, user_id, f"just chatting, message number {i}")
+        if kind == "banned_word":
+            return self.message(chat_id, user_id, f"this one has a {BANNED_WORD} in it")
+        if kind == "link":
+            url = f"https://spam{i % 50}.example.org/offer"
+            text = f"check {url} now"
+            return self.message(chat_id, user_id, text, [MessageEntity(type="url", offset=6, length=len(url))])
+        if kind == "command":
+            return self.message(chat_id, user_id, "!stat")
+        if kind == "callback":
+            user = User(id=OWNER_ID, is_bot=False, first_name="Owner")
+            message = Message(
+                message_id=next(self._message_ids), date=datetime.datetime.now(),
+                chat=Chat(id=chat_id, type="supergroup"), text="⚙️",
+            )
+            query = CallbackQuery(id=str(i), from_user=user, chat_instance=str(chat_id), data="set_censor", message=message)
+            return Update(update_id=next(self._update_ids), callback_query=query)
+        if kind == "join":
+            user = User(id=next(self._joiners), is_bot=False, first_name="Newbie")
+            event = ChatMemberUpdated(
+                chat=Chat(id=chat_id, type="supergroup"), from_user=user, date=datetime.datetime.now(),
+                old_chat_member=ChatMemberLeft(user=user), new_chat_member=ChatMemberMember(user=user),
+            )
+            return Update(update_id=next(self._update_ids), chat_member=event)
+        raise ValueError(f"Unknown update type: {kind}")
+
+def classify(update: Update) -> str:
+    """Update type of a recorded update, as close to UPDATE_TYPES as the raw data allows."""
+    if update.callback_query:
+        return "callback"
+    if update.chat_member:
+        return "join"
+    message = update.message
+    if message is None:
+        return update.event_type
+    if message.text and message.text.startswith("!"):
+        return "command"
+    if any(entity.type in ("url", "text_link") for entity in message.entities or message.caption_entities or []):
+        return "link"
+    return "text"
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+async def setup_chats(bot, dp, factory: UpdateFactory):
+    """Claims every bench chat for OWNER_ID and turns the censor and anti-link on."""
+    for n in range(BENCH_CHATS):
+        chat_id = -1000 - n
+        for text in ("!start", f"!banword {BANNED_WORD}", "!antilink on"):
+            update = factory.message(chat_id, OWNER_ID, text)
+            await dp.feed_update(bot, update)
+    # The owner's messages above are not what we measure
+    await stats_buffer.flush()
+
+async def run(updates: list[tuple[str, Update]], concurrency: int, synthetic: bool) -> dict:
+    await init_db()
+    await pool.open()
+    stats_buffer.start()
+    session = StubSession()
+    bot = Bot("123456:bench", session=session)
+    dp = create_dispatcher()
+    await scheduler.start(bot)
+
+    latencies = {}
+    try:
+        if synthetic:
+            await setup_chats(bot, dp, UpdateFactory())
+        calls_before = session.calls
+        queue = iter(updates)
+
+        async def feeder():
+            for kind, update in queue:
+                start = time.perf_counter()
+                await dp.feed_update(bot, update)
+                latencies.setdefault(kind, []).append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(feeder() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        api_calls = session.calls - calls_before
+        # Welcome messages are sent after a batching delay, let them finish before shutdown
+        await asyncio.gather(*events._welcome_tasks, return_exceptions=True)
+    finally:
+        await scheduler.stop()
+        await log_dispatcher.close()
+        await dp.storage.close()
+        await stats_buffer.stop()
+        await pool.close()
+
+    results = {}
+    for kind, samples in latencies.items():
+        results[kind] = {
+            "count": len(samples),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        }
+    total = sum(len(samples) for samples in latencies.values())
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "aiogram": aiogram.__version__,
+            "sqlite": sqlite3.sqlite_version,
+            "updates": total,
+            "concurrency": concurrency,
+            "api_calls": api_calls,
+        },
+        "overall": {
+            "seconds": round(elapsed, 3),
+            "throughput": round(total / elapsed, 1),
+        },
+        "types": results,
+    }
+
+def print_report(report: dict, baseline: dict | None = None):
+    overall = report["overall"]
+    print(f"{report['meta']['updates']} updates in {overall['seconds']}s: {overall['throughput']} updates/s "
+          f"(concurrency {report['meta']['concurrency']}, {report['meta']['api_calls']} API calls)")
+    # Throughput is only meaningful for the whole run (wall clock); per type, latency is what we have
+    print(f"{'type':<12} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for kind, row in report["types"].items():
+        line = f"{kind:<12} {row['count']:>7} {row['mean_ms']:>9} {row['p50_ms']:>9} {row['p99_ms']:>9}"
+        old = (baseline or {}).get("types", {}).get(kind)
+        if old:
+            # Positive = slower than the baseline
+            p50 = (row["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0
+            p99 = (row["p99_ms"] / old["p99_ms"] - 1) * 100 if old["p99_ms"] else 0
+            line += f"   p50 {p50:+.1f}%  p99 {p99:+.1f}%"
+        print(line)
+
+def load_replay(path: str) -> list[tuple[str, Update]]:
+    updates = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                update = Update.model_validate(json.loads(line))
+                updates.append((classify(update), update))
+    return updates
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay updates through the dispatcher and measure latency.")
+    parser.add_argument("-n", "--updates", type=int, default=1000, help="synthetic updates per type")
+    parser.add_argument("--types", default=",".join(UPDATE_TYPES), help="comma separated subset of " + ", ".join(UPDATE_TYPES))
+    parser.add_argument("--replay", help="JSON lines file of recorded updates instead of synthetic ones")
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="updates processed at once")
+    parser.add_argument("--out", default="bench_results.json", help="where to save the results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Keep the raid detector out of the way, it would lock the bench chats within seconds
+    raid_detector.limits = {}
+
+    if args.replay:
+        updates = load_replay(args.replay)
+    else:
+        kinds = [kind.strip() for kind in args.types.split(",") if kind.strip()]
+        factory = UpdateFactory()
+        # Interleaved, like real traffic
+        updates = [(kind, factory.make(kind, i)) for i in range(args.updates) for kind in kinds]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager.DB_PATH = pool.path = os.path.join(tmp, "bench.db")
+        report = asyncio.run(run(updates, max(1, args.concurrency), synthetic=not args.replay))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved to {args.out}")
+
+if __name__ == "__main__":
+    sys.exit(main())
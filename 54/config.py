@@ -7,5 +7,52 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 _owner_id = os.getenv("OWNER_ID", "0")
 OWNER_ID = int(_owner_id) if _owner_id.isdigit() else 0
 
+def _int_env(name: str, default: int) -> int:
+    value = os.getenv(name, "")
+    return int(value) if value.isdigit() else default
+
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# Webhook mode: the bot listens on WEBHOOK_HOST:WEBHOOK_PORT + WEBHOOK_PATH.
+# WEBHOOK_URL is the public https address Telegram should post to; leave it empty
+# to run the server without registering it (e.g. to post test updates locally).
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = _int_env("WEBHOOK_PORT", 8080)
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_CONNECTIONS = _int_env("WEBHOOK_MAX_CONNECTIONS", 40)
+
+# More than 1 starts a front process that polls Telegram and spreads chats
+# over this many worker processes (polling only)
+WORKERS = _int_env("WORKERS", 1)
+
+# Raid detection: reaching any of these counts within RAID_WINDOW seconds
+# locks the chat for RAID_LOCK_DURATION seconds (0 = until !unlock).
+# Off by default: a limit of 0 ignores that kind of event, e.g. RAID_JOIN_LIMIT=10,
+# RAID_MESSAGE_LIMIT=60 and RAID_LINK_LIMIT=10 suit a busy public group.
+RAID_WINDOW = max(_int_env("RAID_WINDOW", 10), 1)
+RAID_JOIN_LIMIT = _int_env("RAID_JOIN_LIMIT", 0)
+RAID_MESSAGE_LIMIT = _int_env("RAID_MESSAGE_LIMIT", 0)
+RAID_LINK_LIMIT = _int_env("RAID_LINK_LIMIT", 0)
+RAID_LOCK_DURATION = _int_env("RAID_LOCK_DURATION", 900)
+
+# Warns stop counting after WARN_DECAY_DAYS (0 = never) and are deleted
+# after WARN_HISTORY_DAYS, unless they still count
+WARN_DECAY_DAYS = _int_env("WARN_DECAY_DAYS", 30)
+WARN_HISTORY_DAYS = _int_env("WARN_HISTORY_DAYS", 90)
+
+# Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics (0 = off).
+# With WORKERS > 1, worker N listens on METRICS_PORT + N.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _int_env("METRICS_PORT", 9108)
+
+# SQL statements slower than this are logged with their query plan
+SLOW_QUERY_MS = _int_env("SLOW_QUERY_MS", 100)
+
 if not BOT_TOKEN:
     print("WARNING: BOT_TOKEN is not set in .env file!")
+
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    print("WARNING: WEBHOOK_SECRET is not set, webhook requests will not be verified!")
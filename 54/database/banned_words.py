@@ -0,0 +1,36 @@
+from database.manager import get_db
+from utils.word_matcher import WordMatcher
+
+_matchers: dict[int, WordMatcher] = {}
+# Bumped on every invalidation, so a load that raced with a write is not cached
+_generation: dict[int, int] = {}
+
+async def load_word_matcher(db, chat_id: int) -> WordMatcher:
+    async with db.execute("SELECT word FROM banned_words WHERE chat_id = ?", (chat_id,)) as cursor:
+        rows = await cursor.fetchall()
+    return WordMatcher(row[0] for row in rows)
+
+async def get_word_matcher(chat_id: int, db=None) -> WordMatcher:
+    """
+    Returns the compiled banned-word matcher for the chat, building it on first use.
+    Pass db to load through a connection the caller already holds.
+    """
+    matcher = _matchers.get(chat_id)
+    if matcher is not None:
+        return matcher
+
+    generation = _generation.get(chat_id, 0)
+    if db is not None:
+        matcher = await load_word_matcher(db, chat_id)
+    else:
+        async with get_db(readonly=True) as db:
+            matcher = await load_word_matcher(db, chat_id)
+
+    if _generation.get(chat_id, 0) == generation:
+        _matchers[chat_id] = matcher
+    return matcher
+
+def invalidate_word_matcher(chat_id: int):
+    """Call after committing any change to the chat's banned_words rows."""
+    _matchers.pop(chat_id, None)
+    _generation[chat_id] = _generation.get(chat_id, 0) + 1
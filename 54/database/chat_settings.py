@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+
+from database.manager import get_db
+
+SETTINGS_COLUMNS = (
+    "language", "warn_limit", "warn_punishment", "delete_on_ban", "delete_on_kick",
+    "delete_on_mute", "users_can_setname", "owner_id", "log_channel_id", "welcome_message",
+    "antilink_enabled", "antilink_warn", "censor_enabled", "censor_punishment",
+    "censor_punish_duration", "lockdown_enabled",
+)
+
+@dataclass
+class ChatSettings:
+    """
+    Snapshot of one row of the chats table.
+    Defaults match the column defaults, so a chat without a row behaves the same.
+    """
+    chat_id: int
+    exists: bool = False
+    language: str = "ru"
+    warn_limit: int = 3
+    warn_punishment: str = "ban"
+    delete_on_ban: bool = True
+    delete_on_kick: bool = True
+    delete_on_mute: bool = False
+    users_can_setname: bool = True
+    owner_id: int | None = None
+    log_channel_id: int | None = None
+    welcome_message: str | None = None
+    antilink_enabled: bool = False
+    antilink_warn: bool = False
+    censor_enabled: bool = False
+    censor_punishment: str = "mute"
+    censor_punish_duration: int = 180
+    lockdown_enabled: bool = False
+
+    @classmethod
+    def from_row(cls, chat_id: int, row) -> "ChatSettings":
+        values = dict(zip(SETTINGS_COLUMNS, row))
+        return cls(
+            chat_id=chat_id,
+            exists=True,
+            language=values["language"] or "ru",
+            warn_limit=values["warn_limit"] or 3,
+            warn_punishment=values["warn_punishment"] or "ban",
+            delete_on_ban=bool(values["delete_on_ban"]),
+            delete_on_kick=bool(values["delete_on_kick"]),
+            delete_on_mute=bool(values["delete_on_mute"]),
+            users_can_setname=bool(values["users_can_setname"]),
+            owner_id=values["owner_id"],
+            log_channel_id=values["log_channel_id"],
+            welcome_message=values["welcome_message"],
+            antilink_enabled=bool(values["antilink_enabled"]),
+            antilink_warn=bool(values["antilink_warn"]),
+            censor_enabled=bool(values["censor_enabled"]),
+            censor_punishment=values["censor_punishment"] or "mute",
+            censor_punish_duration=values["censor_punish_duration"] or 180,
+            lockdown_enabled=bool(values["lockdown_enabled"]),
+        )
+
+
+SELECT_SETTINGS_SQL = f"SELECT {', '.join(SETTINGS_COLUMNS)} FROM chats WHERE chat_id = ?"
+
+_cache: dict[int, ChatSettings] = {}
+# Bumped on every invalidation, so a load that raced with a write is not cached
+_generation: dict[int, int] = {}
+
+async def load_chat_settings(db, chat_id: int) -> ChatSettings:
+    async with db.execute(SELECT_SETTINGS_SQL, (chat_id,)) as cursor:
+        row = await cursor.fetchone()
+    if row:
+        return ChatSettings.from_row(chat_id, row)
+    return ChatSettings(chat_id=chat_id)
+
+async def get_chat_settings(chat_id: int, db=None) -> ChatSettings:
+    """
+    Returns cached settings for the chat, loading them on first use.
+    Pass db to load through a connection the caller already holds.
+    Treat the result as read-only; writers must call invalidate_chat_settings().
+    """
+    settings = _cache.get(chat_id)
+    if settings is not None:
+        return settings
+
+    generation = _generation.get(chat_id, 0)
+    if db is not None:
+        settings = await load_chat_settings(db, chat_id)
+    else:
+        async with get_db(readonly=True) as db:
+            settings = await load_chat_settings(db, chat_id)
+
+    if _generation.get(chat_id, 0) == generation:
+        _cache[chat_id] = settings
+    return settings
+
+def invalidate_chat_settings(chat_id: int):
+    """Call after committing any change to the chats row."""
+    _cache.pop(chat_id, None)
+    _generation[chat_id] = _generation.get(chat_id, 0) + 1
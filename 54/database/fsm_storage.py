@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from database.manager import get_db
+
+# A prompt nobody answered within this time is forgotten
+FSM_STATE_TTL = 3600  # seconds
+# Changed states are written to the database at most this often
+FSM_FLUSH_INTERVAL = 1  # seconds
+# Expired rows are purged from the database this often
+FSM_SWEEP_INTERVAL = 600  # seconds
+# Records kept in memory; older ones are read back from the database on demand
+FSM_CACHE_SIZE = 1000
+
+UPSERT_SQL = """
+    INSERT INTO fsm_states (key, state, data, updated_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(key) DO UPDATE SET
+        state = excluded.state,
+        data = excluded.data,
+        updated_at = excluded.updated_at
+"""
+
+class _Record:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: str | None = None, data: dict | None = None, updated_at: float = 0):
+        self.state = state
+        self.data = data or {}
+        self.updated_at = updated_at
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+    def expired(self, now: float) -> bool:
+        return now - self.updated_at > FSM_STATE_TTL
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage kept in the fsm_states table, so pending prompts survive a restart.
+    Reads are served from a bounded LRU cache, changes are written behind in
+    batches, and states untouched for FSM_STATE_TTL are dropped.
+    """
+
+    def __init__(self):
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache = OrderedDict()  # key -> _Record, most recently used last
+        self._dirty = {}  # key -> _Record waiting to be written
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    async def _load(self, key: str) -> _Record:
+        record = self._dirty.get(key)
+        if record is None:
+            record = self._cache.get(key)
+        if record is None:
+            async with get_db(readonly=True) as db:
+                async with db.execute("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,)) as cursor:
+                    row = await cursor.fetchone()
+            record = _Record(row[0], json.loads(row[1]), row[2]) if row else _Record()
+
+        if not record.empty and record.expired(time.time()):
+            record = _Record()
+        self._remember(key, record)
+        return record
+
+    def _remember(self, key: str, record: _Record):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > FSM_CACHE_SIZE:
+            # Dirty records stay reachable through _dirty until flushed
+            self._cache.popitem(last=False)
+
+    def _store(self, key: str, record: _Record):
+        record.updated_at = time.time()
+        self._remember(key, record)
+        self._dirty[key] = record
+        if self._task is None and not self._closing:
+            self._task = asyncio.create_task(self._run())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._load(storage_key)
+        self._store(storage_key, _Record(state.state if isinstance(state, State) else state, record.data))
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._load(self.key_builder.build(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        storage_key = self.key_builder.build(key)
+        record = await self._load(storage_key)
+        self._store(storage_key, _Record(record.state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._load(self.key_builder.build(key))).data.copy()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+
+            upserts = [(key, r.state, json.dumps(r.data), r.updated_at) for key, r in batch.items() if not r.empty]
+            deletes = [(key,) for key, r in batch.items() if r.empty]
+            try:
+                async with get_db() as db:
+                    if upserts:
+                        await db.executemany(UPSERT_SQL, upserts)
+                    if deletes:
+                        await db.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+                    await db.commit()
+            except Exception as e:
+                # Keep newer changes made while the write was failing
+                for key, record in batch.items():
+                    self._dirty.setdefault(key, record)
+                logging.error(f"Failed to save FSM states: {e}")
+
+    async def sweep(self):
+        """Drops expired states from memory and from the database."""
+        now = time.time()
+        for key in [key for key, r in self._cache.items() if r.expired(now) and key not in self._dirty]:
+            del self._cache[key]
+        try:
+            async with get_db() as db:
+                await db.execute("DELETE FROM fsm_states WHERE updated_at < ?", (now - FSM_STATE_TTL,))
+                await db.commit()
+        except Exception as e:
+            logging.error(f"Failed to purge expired FSM states: {e}")
+
+    async def _run(self):
+        next_sweep = time.monotonic()
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=FSM_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            if time.monotonic() >= next_sweep:
+                await self.sweep()
+                next_sweep = time.monotonic() + FSM_SWEEP_INTERVAL
+
+    async def close(self) -> None:
+        # May run twice (dispatcher shutdown and main), the second call is a no-op
+        self._closing = True
+        if self._task is not None:
+            # Let the loop finish its current write instead of cancelling it mid-way
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
@@ -0,0 +1,36 @@
+from database.manager import get_db
+from utils.link_classifier import LinkPolicy
+
+_policies: dict[int, LinkPolicy] = {}
+# Bumped on every invalidation, so a load that raced with a write is not cached
+_generation: dict[int, int] = {}
+
+async def load_link_policy(db, chat_id: int) -> LinkPolicy:
+    async with db.execute("SELECT domain, allowed FROM link_rules WHERE chat_id = ?", (chat_id,)) as cursor:
+        rows = await cursor.fetchall()
+    return LinkPolicy((domain, bool(allowed)) for domain, allowed in rows)
+
+async def get_link_policy(chat_id: int, db=None) -> LinkPolicy:
+    """
+    Returns the anti-link allow/deny policy for the chat, building it on first use.
+    Pass db to load through a connection the caller already holds.
+    """
+    policy = _policies.get(chat_id)
+    if policy is not None:
+        return policy
+
+    generation = _generation.get(chat_id, 0)
+    if db is not None:
+        policy = await load_link_policy(db, chat_id)
+    else:
+        async with get_db(readonly=True) as db:
+            policy = await load_link_policy(db, chat_id)
+
+    if _generation.get(chat_id, 0) == generation:
+        _policies[chat_id] = policy
+    return policy
+
+def invalidate_link_policy(chat_id: int):
+    """Call after committing any change to the chat's link_rules rows."""
+    _policies.pop(chat_id, None)
+    _generation[chat_id] = _generation.get(chat_id, 0) + 1
@@ -1,90 +1,261 @@
+import asyncio
 import aiosqlite
+import logging
 import os
+import re
+import time
+from contextlib import asynccontextmanager
+
+from aiosqlite.context import contextmanager
+
+import config
+from database.migrations import migrate
+from utils.metrics import db_query_seconds
 
 DB_PATH = "bot_database.db"
 
+# Number of read-only connections kept open next to the single writer
+READ_POOL_SIZE = 4
+
+# Queries that run on (almost) every update, checked with EXPLAIN QUERY PLAN at startup
+HOT_QUERIES = (
+    ("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", ("user", 0)),
+    ("SELECT username, message_count FROM users WHERE chat_id = ? ORDER BY message_count DESC LIMIT 10", (0,)),
+    ("SELECT role FROM users WHERE user_id = ? AND chat_id = ?", (0, 0)),
+    ("SELECT count(*) FROM warn_events WHERE chat_id = ? AND user_id = ? AND ts >= ? AND cleared = 0", (0, 0, 0)),
+    ("SELECT * FROM chats WHERE chat_id = ?", (0,)),
+    ("SELECT word FROM banned_words WHERE chat_id = ?", (0,)),
+    ("SELECT user_id, username FROM users WHERE chat_id = ? AND joined_at >= datetime('now', ?) LIMIT ?", (0, "-10 minutes", 1)),
+)
+
+# Applied once per connection when the pool opens
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+)
+
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Users table: stores stats, status (warns) and bot-level roles
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER,
-                chat_id INTEGER,
-                username TEXT,
-                message_count INTEGER DEFAULT 0,
-                warns INTEGER DEFAULT 0,
-                role TEXT DEFAULT 'user',
-                joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (user_id, chat_id)
-            )
-        """)
-        
-        # Migration: Check if username column exists
-        async with db.execute("PRAGMA table_info(users)") as cursor:
-            columns = await cursor.fetchall()
-            # columns is list of (cid, name, type, notnull, dflt_value, pk)
-            column_names = [col[1] for col in columns]
-            
-            if "username" not in column_names:
-                print("Migrating database: Adding username column...")
-                await db.execute("ALTER TABLE users ADD COLUMN username TEXT")
-                await db.commit()
-        
-        # Chats table: stores chat-specific settings
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS chats (
-                chat_id INTEGER PRIMARY KEY,
-                language TEXT DEFAULT 'ru',
-                warn_limit INTEGER DEFAULT 3,
-                warn_punishment TEXT DEFAULT 'ban',
-                delete_on_ban INTEGER DEFAULT 1,
-                delete_on_kick INTEGER DEFAULT 1,
-                delete_on_mute INTEGER DEFAULT 0,
-                users_can_setname INTEGER DEFAULT 1,
-                owner_id INTEGER,
-                log_channel_id INTEGER,
-                welcome_message TEXT,
-                antilink_enabled INTEGER DEFAULT 0,
-                antilink_warn INTEGER DEFAULT 0,
-                censor_enabled INTEGER DEFAULT 0,
-                censor_punishment TEXT DEFAULT 'mute',
-                censor_punish_duration INTEGER DEFAULT 180,
-                lockdown_enabled INTEGER DEFAULT 0
-            )
-        """)
-        
-        # Banned Words table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS banned_words (
-                chat_id INTEGER,
-                word TEXT,
-                PRIMARY KEY (chat_id, word)
-            )
-        """)
-
-        # Migration for chats table (add new columns if missing)
-        async with db.execute("PRAGMA table_info(chats)") as cursor:
-            columns = await cursor.fetchall()
-            max_col_names = [col[1] for col in columns]
-            
-            new_cols = {
-                "log_channel_id": "INTEGER",
-                "welcome_message": "TEXT",
-                "antilink_enabled": "INTEGER DEFAULT 0",
-                "antilink_warn": "INTEGER DEFAULT 0",
-                "censor_enabled": "INTEGER DEFAULT 0",
-                "censor_enabled": "INTEGER DEFAULT 0",
-                "censor_punishment": "TEXT DEFAULT 'mute'",
-                "censor_punish_duration": "INTEGER DEFAULT 180",
-                "lockdown_enabled": "INTEGER DEFAULT 0"
-            }
-            
-            for col_name, col_def in new_cols.items():
-                if col_name not in max_col_names:
-                    print(f"Migrating database: Adding {col_name} to chats...")
-                    await db.execute(f"ALTER TABLE chats ADD COLUMN {col_name} {col_def}")
-                    
-        await db.commit()
-
-def get_db():
-    return aiosqlite.connect(DB_PATH)
+    # Autocommit mode, migrate() manages its own transaction
+    async with aiosqlite.connect(DB_PATH, isolation_level=None) as db:
+        await migrate(db)
+        await check_query_plans(db)
+
+async def check_query_plans(db):
+    """
+    Runs EXPLAIN QUERY PLAN on every hot query and warns when one of them
+    scans a table or an index instead of searching it, or sorts in a temporary b-tree.
+    Hot queries are all point or range lookups, so any SCAN step is a missing index.
+    """
+    for sql, params in HOT_QUERIES:
+        plan = await query_plan(db, sql, params)
+        for step in plan:
+            if step.startswith("SCAN") or "TEMP B-TREE" in step:
+                logging.warning(f"Slow query plan ({step}): {' '.join(sql.split())}")
+
+# Statements slower than this are logged together with their query plan
+SLOW_QUERY_SECONDS = config.SLOW_QUERY_MS / 1000
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\?(\s*,\s*\?)+")
+_VALUES_LIST_RE = re.compile(r"\(\?, \.\.\.\)(\s*,\s*\(\?, \.\.\.\))+")
+_EXPLAINABLE = ("SELECT", "INSERT", "REPLACE", "UPDATE", "DELETE", "WITH")
+# SQL text -> fingerprint; statements are code constants, so this stays small
+_fingerprints = {}
+
+def fingerprint(sql: str) -> str:
+    """
+    One name per statement shape, for metrics and the query stats:
+    whitespace collapsed, literals replaced by ?, IN (?, ?, ...) and VALUES lists folded.
+    """
+    result = _fingerprints.get(sql)
+    if result is None:
+        result = " ".join(sql.split())
+        result = _STRING_LITERAL_RE.sub("?", result)
+        result = _NUMBER_LITERAL_RE.sub("?", result)
+        result = _PLACEHOLDER_LIST_RE.sub("?, ...", result)
+        result = _VALUES_LIST_RE.sub("(?, ...), ...", result)
+        if len(_fingerprints) < 1000:
+            _fingerprints[sql] = result
+    return result
+
+async def query_plan(db, sql: str, parameters=()) -> list[str]:
+    async with db.execute(f"EXPLAIN QUERY PLAN {sql}", parameters or ()) as cursor:
+        return [row[3] for row in await cursor.fetchall()]
+
+class QueryStats:
+    """Calls, total/max time and slow runs per statement fingerprint since startup (or reset())."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.since = time.time()
+        self._stats = {}  # fingerprint -> [calls, total seconds, max seconds, slow calls]
+
+    def record(self, statement: str, elapsed: float, slow: bool):
+        entry = self._stats.get(statement)
+        if entry is None:
+            entry = self._stats[statement] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed > entry[2]:
+            entry[2] = elapsed
+        if slow:
+            entry[3] += 1
+
+    def top(self, n: int = 10) -> list[tuple[str, int, float, float, int]]:
+        """(fingerprint, calls, total, max, slow) of the n statements with the most total time."""
+        rows = sorted(self._stats.items(), key=lambda item: item[1][1], reverse=True)[:n]
+        return [(statement, *entry) for statement, entry in rows]
+
+
+query_stats = QueryStats()
+
+class InstrumentedConnection:
+    """
+    Pooled aiosqlite connection that times every statement: each run goes to
+    /metrics and query_stats, and slow ones are logged with their EXPLAIN QUERY PLAN.
+    Works like the connection it wraps, including `async with db.execute(...)`.
+    """
+    __slots__ = ("_conn",)
+
+    # Plans of slow statements, explained once per fingerprint
+    _plans = {}
+
+    def __init__(self, conn: aiosqlite.Connection):
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # row_factory and friends belong to the real connection
+        setattr(self._conn, name, value)
+
+    async def _timed(self, call, sql: str, parameters=None):
+        start = time.perf_counter()
+        try:
+            return await call
+        finally:
+            elapsed = time.perf_counter() - start
+            statement = fingerprint(sql)
+            slow = elapsed >= SLOW_QUERY_SECONDS
+            db_query_seconds.observe(elapsed, statement)
+            query_stats.record(statement, elapsed, slow)
+            if slow:
+                await self._log_slow(statement, sql, parameters, elapsed)
+
+    async def _log_slow(self, statement: str, sql: str, parameters, elapsed: float):
+        plan = self._plans.get(statement)
+        if plan is None and parameters is not None and sql.lstrip().upper().startswith(_EXPLAINABLE):
+            try:
+                plan = self._plans[statement] = await query_plan(self._conn, sql, parameters)
+            except Exception as e:
+                plan = [f"(no plan: {e})"]
+        details = f"; plan: {' | '.join(plan)}" if plan else ""
+        logging.warning(f"Slow query ({elapsed * 1000:.0f} ms): {statement}{details}")
+
+    @contextmanager
+    async def execute(self, sql: str, parameters=None):
+        return await self._timed(self._conn.execute(sql, parameters), sql, parameters or ())
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters):
+        # No plan for batches, the parameters are an iterator that is already consumed
+        return await self._timed(self._conn.executemany(sql, parameters), sql)
+
+    async def commit(self):
+        # Mostly the WAL write, a slow one points at the disk rather than a query
+        return await self._timed(self._conn.commit(), "COMMIT")
+
+class DatabasePool:
+    """
+    Long-lived aiosqlite connections shared by the whole bot.
+    One writer connection (serialized by a lock) and a bounded set of readers.
+    WAL mode lets readers run while the writer holds a transaction.
+    """
+
+    def __init__(self, path: str, readers: int = READ_POOL_SIZE):
+        self.path = path
+        self.size = readers
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        self._all_readers = []
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, readonly: bool):
+        conn = await aiosqlite.connect(self.path)
+        for pragma in CONNECTION_PRAGMAS:
+            await (await conn.execute(pragma)).close()
+        if readonly:
+            await (await conn.execute("PRAGMA query_only = 1")).close()
+        return InstrumentedConnection(conn)
+
+    async def open(self):
+        if self.is_open:
+            return
+
+        self._writer = await self._connect(readonly=False)
+        # journal_mode is stored in the db file, so the writer sets it once for everyone
+        async with self._writer.execute("PRAGMA journal_mode = WAL") as cursor:
+            await cursor.fetchone()
+
+        for _ in range(self.size):
+            conn = await self._connect(readonly=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        if not self.is_open:
+            return
+
+        async with self._write_lock:
+            await self._writer.close()
+            self._writer = None
+
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._readers = asyncio.Queue()
+
+    @asynccontextmanager
+    async def acquire(self, readonly: bool = False):
+        if not self.is_open:
+            raise RuntimeError("Database pool is not open, call pool.open() first")
+
+        if readonly:
+            conn = await self._readers.get()
+            try:
+                yield conn
+            finally:
+                conn.row_factory = None
+                self._readers.put_nowait(conn)
+            return
+
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+            finally:
+                # Uncommitted work is dropped, same as closing a one-off connection used to do
+                if conn.in_transaction:
+                    await conn.rollback()
+                conn.row_factory = None
+
+
+pool = DatabasePool(DB_PATH)
+
+def get_db(readonly: bool = False):
+    """
+    Borrows a pooled connection: `async with get_db() as db: ...`
+    Pure SELECT blocks should pass readonly=True so they don't queue behind writes.
+    Don't nest a writer block inside another writer block, the lock is not reentrant.
+    """
+    return pool.acquire(readonly=readonly)
@@ -0,0 +1,198 @@
+import logging
+
+# Numbered schema migrations. The applied version lives in PRAGMA user_version,
+# so a database that is already current costs a single PRAGMA read at startup.
+# Never edit a migration that has shipped, append a new one instead.
+
+async def _add_missing_columns(db, table: str, columns: dict):
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {col[1] for col in await cursor.fetchall()}
+
+    for col_name, col_def in columns.items():
+        if col_name not in existing:
+            logging.info(f"Migrating database: Adding {col_name} to {table}...")
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_def}")
+
+async def m001_base_schema(db):
+    # Users table: stores stats, status (warns) and bot-level roles
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER,
+            chat_id INTEGER,
+            username TEXT,
+            message_count INTEGER DEFAULT 0,
+            warns INTEGER DEFAULT 0,
+            role TEXT DEFAULT 'user',
+            joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, chat_id)
+        )
+    """)
+
+    # Chats table: stores chat-specific settings
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY,
+            language TEXT DEFAULT 'ru',
+            warn_limit INTEGER DEFAULT 3,
+            warn_punishment TEXT DEFAULT 'ban',
+            delete_on_ban INTEGER DEFAULT 1,
+            delete_on_kick INTEGER DEFAULT 1,
+            delete_on_mute INTEGER DEFAULT 0,
+            users_can_setname INTEGER DEFAULT 1,
+            owner_id INTEGER,
+            log_channel_id INTEGER,
+            welcome_message TEXT,
+            antilink_enabled INTEGER DEFAULT 0,
+            antilink_warn INTEGER DEFAULT 0,
+            censor_enabled INTEGER DEFAULT 0,
+            censor_punishment TEXT DEFAULT 'mute',
+            censor_punish_duration INTEGER DEFAULT 180,
+            lockdown_enabled INTEGER DEFAULT 0
+        )
+    """)
+
+    # Banned Words table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS banned_words (
+            chat_id INTEGER,
+            word TEXT,
+            PRIMARY KEY (chat_id, word)
+        )
+    """)
+
+    # Databases created before versioning may lack columns added over time
+    await _add_missing_columns(db, "users", {"username": "TEXT"})
+    await _add_missing_columns(db, "chats", {
+        "log_channel_id": "INTEGER",
+        "welcome_message": "TEXT",
+        "antilink_enabled": "INTEGER DEFAULT 0",
+        "antilink_warn": "INTEGER DEFAULT 0",
+        "censor_enabled": "INTEGER DEFAULT 0",
+        "censor_punishment": "TEXT DEFAULT 'mute'",
+        "censor_punish_duration": "INTEGER DEFAULT 180",
+        "lockdown_enabled": "INTEGER DEFAULT 0",
+    })
+
+async def m002_users_indexes(db):
+    # Username resolution and !top
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_chat_username ON users (chat_id, username)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_chat_messages ON users (chat_id, message_count DESC)")
+
+async def m003_fsm_states(db):
+    # Pending settings prompts (database/fsm_storage.py)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)")
+
+async def m004_scheduled_actions(db):
+    # Pending punishment expiries and other delayed actions (utils/scheduler.py).
+    # AUTOINCREMENT: ids are never reused, the in-memory heap relies on that
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS scheduled_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL,
+            due REAL NOT NULL,
+            data TEXT NOT NULL DEFAULT '{}',
+            UNIQUE (kind, chat_id, target_id)
+        )
+    """)
+
+async def m005_users_joined_at(db):
+    # "joined in the last N minutes" selector of the bulk commands. joined_date is when
+    # the bot first saw a user; joined_at is set only by join updates (handlers/events.py),
+    # so old members who merely wrote their first message are never picked up
+    await _add_missing_columns(db, "users", {"joined_at": "TIMESTAMP"})
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_chat_joined_at ON users (chat_id, joined_at)")
+
+async def m006_warn_events(db):
+    # One row per warn (utils/warn_engine.py); replaces the users.warns counter,
+    # which is no longer written. cleared = consumed by a punishment.
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS warn_events (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            issuer_id INTEGER,
+            source TEXT NOT NULL,
+            reason TEXT,
+            ts REAL NOT NULL,
+            cleared INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_warn_events_user ON warn_events (chat_id, user_id, ts)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_warn_events_ts ON warn_events (ts)")
+
+    # Carry over the current counters as undated "legacy" warns
+    await db.execute("""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000)
+        INSERT INTO warn_events (chat_id, user_id, source, ts)
+        SELECT u.chat_id, u.user_id, 'legacy', CAST(strftime('%s', 'now') AS REAL)
+        FROM users u JOIN n ON n.i <= u.warns
+        WHERE u.warns > 0
+    """)
+
+async def m007_link_rules(db):
+    # Per-chat anti-link allow/deny domains (database/link_rules.py);
+    # a rule covers the domain and its subdomains
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS link_rules (
+            chat_id INTEGER NOT NULL,
+            domain TEXT NOT NULL,
+            allowed INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, domain)
+        )
+    """)
+
+async def m008_lockdown_permissions(db):
+    # Chat permissions in force before a lockdown (utils/lockdown.py), JSON; restored on unlock
+    await _add_missing_columns(db, "chats", {"saved_permissions": "TEXT"})
+
+MIGRATIONS = (
+    (1, m001_base_schema),
+    (2, m002_users_indexes),
+    (3, m003_fsm_states),
+    (4, m004_scheduled_actions),
+    (5, m005_users_joined_at),
+    (6, m006_warn_events),
+    (7, m007_link_rules),
+    (8, m008_lockdown_permissions),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+async def get_schema_version(db) -> int:
+    async with db.execute("PRAGMA user_version") as cursor:
+        return (await cursor.fetchone())[0]
+
+async def migrate(db) -> int:
+    """
+    Applies every pending migration in one transaction and returns the new version.
+    The connection must be in autocommit mode (isolation_level=None).
+    """
+    version = await get_schema_version(db)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    pending = [(number, step) for number, step in MIGRATIONS if number > version]
+
+    await db.execute("BEGIN IMMEDIATE")
+    try:
+        for number, step in pending:
+            logging.info(f"Applying database migration {number}: {step.__name__}")
+            await step(db)
+        # user_version is transactional, it only moves if every step succeeded
+        await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        await db.execute("COMMIT")
+    except BaseException:
+        await db.execute("ROLLBACK")
+        raise
+
+    return SCHEMA_VERSION
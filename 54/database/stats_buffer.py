@@ -0,0 +1,92 @@
+import asyncio
+import logging
+
+from database.manager import get_db
+
+# Flush pending counters at least this often...
+FLUSH_INTERVAL = 0.5  # seconds
+# ...or as soon as this many (user, chat) pairs are waiting
+MAX_PENDING = 500
+
+UPSERT_SQL = """
+    INSERT INTO users (user_id, chat_id, username, message_count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, chat_id) DO UPDATE SET
+        message_count = message_count + excluded.message_count,
+        username = COALESCE(excluded.username, users.username)
+"""
+
+class StatsBuffer:
+    """
+    Write-behind accumulator for message counters.
+    Increments are merged per (user_id, chat_id) in memory and written
+    in a single transaction, instead of one commit per message.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}  # (user_id, chat_id) -> [count, username]
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    def add(self, user_id: int, chat_id: int, username: str | None = None):
+        entry = self._pending.get((user_id, chat_id))
+        if entry is None:
+            self._pending[(user_id, chat_id)] = [1, username]
+        else:
+            entry[0] += 1
+            if username:
+                entry[1] = username
+
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def flush(self):
+        # The lock makes readers wait for an in-flight flush, so after
+        # `await flush()` every message counted so far is in the database
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+
+            rows = [(user_id, chat_id, username, count) for (user_id, chat_id), (count, username) in batch.items()]
+            try:
+                async with get_db() as db:
+                    await db.executemany(UPSERT_SQL, rows)
+                    await db.commit()
+            except Exception as e:
+                # Put the counts back so they are retried on the next flush
+                for (key, (count, username)) in batch.items():
+                    entry = self._pending.setdefault(key, [0, None])
+                    entry[0] += count
+                    entry[1] = entry[1] or username
+                logging.error(f"Failed to flush message stats: {e}")
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let the loop finish its current flush instead of cancelling it mid-write
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+stats_buffer = StatsBuffer()
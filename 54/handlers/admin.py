@@ -5,79 +5,44 @@ from datetime import datetime, timedelta
 
 from utils.time_parser import parse_time
 from utils.i18n import i18n
+from utils.commands import commands
+from utils.scheduler import scheduler, ScheduledAction
+from utils.targets import resolve_target
+from utils.api_executor import notify
 from database.manager import get_db
+from database.chat_settings import get_chat_settings
 
 router = Router()
 
-@router.message(lambda msg: msg.text and msg.text.split()[0] == "!kick")
+@commands.command("!kick")
 async def kick_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin", "helper"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
-    target_user = None
-    if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-    elif message.entities:
-        for entity in message.entities:
-            if entity.type == "text_mention":
-                target_user = entity.user
-            # Simple mention parsing if needed, but text_mention is reliable
-
+    target_user = await resolve_target(message)
     if not target_user:
-        # Try to find by username in DB
-        username_query = None
-        for word in message.text.split():
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        user_id = row[0]
-                        # We need a User object or at least ID. 
-                        # aiogram methods usually take ID.
-                        # Mocking a simple object or just passing ID where needed.
-                        # But for full_name we might need to fetch info? 
-                        # We can just use username or "User" if name unknown.
-                        from aiogram.types import User
-                        target_user = User(id=user_id, is_bot=False, first_name=username_query)
-        
-        # If still not found and arguments exist, maybe user ID? 
-        # But commonly just username/reply.
-        pass # If we fail here, target_user is None
-    
-    if not target_user:
-        await message.reply(i18n.get(lang_code, "user_not_found"))
+        await notify(message, i18n.get(lang_code, "user_not_found"), reply=True)
         return
 
     chat_id = message.chat.id
-    revoke_msgs = True # Default
-    
-    async with get_db() as db:
-        async with db.execute("SELECT delete_on_kick FROM chats WHERE chat_id = ?", (chat_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                revoke_msgs = bool(row[0])
+    revoke_msgs = (await get_chat_settings(chat_id)).delete_on_kick
 
     try:
         # Kick implementation: Ban (possibly deleting messages) then Unban
         await message.chat.ban(target_user.id, revoke_messages=revoke_msgs)
         await message.chat.unban(target_user.id)
-        await message.reply(i18n.get(lang_code, "kick_issued", name=target_user.full_name))
+        await notify(message, i18n.get(lang_code, "kick_issued", name=target_user.full_name), reply=True)
         
         from utils.logger import log_action
         await log_action(message.bot, message.chat.id, "Kick", f"User: {target_user.full_name} (ID: {target_user.id})\nAdmin: {message.from_user.full_name}")
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
-@router.message(lambda msg: msg.text and msg.text.split()[0] == "!ban")
+@commands.command("!ban")
 async def ban_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin", "helper"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
     parts = message.text.split()
@@ -89,76 +54,34 @@ async def ban_handler(message: Message, user_role: str, lang_code: str):
             time_delta = parsed
             break
 
-    target_user = None
-    if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-    elif message.entities:
-        for entity in message.entities:
-            if entity.type == "text_mention":
-                target_user = entity.user
-
-    if not target_user:
-        # Try to find by username in DB
-        username_query = None
-        for word in message.text.split():
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        user_id = row[0]
-                        from aiogram.types import User
-                        target_user = User(id=user_id, is_bot=False, first_name=username_query)
-
+    target_user = await resolve_target(message)
     if not target_user:
-        # Try to find by username in DB
-        username_query = None
-        for word in message.text.split():
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        user_id = row[0]
-                        from aiogram.types import User
-                        target_user = User(id=user_id, is_bot=False, first_name=username_query)
-
-    if not target_user:
-        await message.reply(i18n.get(lang_code, "user_not_found"))
+        await notify(message, i18n.get(lang_code, "user_not_found"), reply=True)
         return
 
     until_date = None
     if time_delta:
         until_date = datetime.now() + time_delta
 
-    revoke_msgs = True
-    async with get_db() as db:
-        async with db.execute("SELECT delete_on_ban FROM chats WHERE chat_id = ?", (message.chat.id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                revoke_msgs = bool(row[0])
+    revoke_msgs = (await get_chat_settings(message.chat.id)).delete_on_ban
 
     try:
         await message.chat.ban(target_user.id, until_date=until_date, revoke_messages=revoke_msgs)
-        await message.reply(i18n.get(lang_code, "ban_issued", name=target_user.full_name))
+        if until_date:
+            await scheduler.schedule("unban", message.chat.id, target_user.id, until_date, {"name": target_user.full_name})
+        else:
+            await scheduler.cancel("unban", message.chat.id, target_user.id)
+        await notify(message, i18n.get(lang_code, "ban_issued", name=target_user.full_name), reply=True)
         
         from utils.logger import log_action
         await log_action(message.bot, message.chat.id, "Ban", f"User: {target_user.full_name}\nUntil: {until_date}\nAdmin: {message.from_user.full_name}")
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
-@router.message(lambda msg: msg.text and msg.text.split()[0] == "!mute")
+@commands.command("!mute")
 async def mute_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin", "helper"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
     parts = message.text.split()
@@ -180,33 +103,9 @@ async def mute_handler(message: Message, user_role: str, lang_code: str):
     if time_delta > timedelta(days=90):
         time_delta = timedelta(days=90)
 
-    target_user = None
-    if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-    elif message.entities:
-       for entity in message.entities:
-            if entity.type == "text_mention":
-                target_user = entity.user
-
+    target_user = await resolve_target(message)
     if not target_user:
-        # Try to find by username in DB
-        username_query = None
-        for word in message.text.split():
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        user_id = row[0]
-                        from aiogram.types import User
-                        target_user = User(id=user_id, is_bot=False, first_name=username_query)
-
-    if not target_user:
-        await message.reply(i18n.get(lang_code, "user_not_found"))
+        await notify(message, i18n.get(lang_code, "user_not_found"), reply=True)
         return
 
     until_date = datetime.now() + time_delta
@@ -218,79 +117,41 @@ async def mute_handler(message: Message, user_role: str, lang_code: str):
             permissions=ChatPermissions(can_send_messages=False),
             until_date=until_date
         )
-        await message.reply(i18n.get(lang_code, "mute_issued", name=target_user.full_name, time=str(time_delta)))
+        await scheduler.schedule("unmute", message.chat.id, target_user.id, until_date, {"name": target_user.full_name})
+        await notify(message, i18n.get(lang_code, "mute_issued", name=target_user.full_name, time=str(time_delta)), reply=True)
         
         from utils.logger import log_action
         await log_action(message.bot, message.chat.id, "Mute", f"User: {target_user.full_name}\nTime: {time_delta}\nAdmin: {message.from_user.full_name}")
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
-@router.message(lambda msg: msg.text and msg.text.split()[0] == "!unban")
+@commands.command("!unban")
 async def unban_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
-    target_user = None
-    if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-
+    target_user = await resolve_target(message)
     if not target_user:
-        # Try to find by username in DB
-        username_query = None
-        for word in message.text.split():
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        user_id = row[0]
-                        from aiogram.types import User
-                        target_user = User(id=user_id, is_bot=False, first_name=username_query)
-
-    if not target_user:
-        await message.reply(i18n.get(lang_code, "user_not_found"))
+        await notify(message, i18n.get(lang_code, "user_not_found"), reply=True)
         return
 
     try:
         await message.chat.unban(target_user.id)
-        await message.reply(i18n.get(lang_code, "unban_success", name=target_user.full_name))
+        await scheduler.cancel("unban", message.chat.id, target_user.id)
+        await notify(message, i18n.get(lang_code, "unban_success", name=target_user.full_name), reply=True)
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
-@router.message(lambda msg: msg.text and msg.text.split()[0] == "!unmute")
+@commands.command("!unmute")
 async def unmute_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin", "helper"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
-    target_user = None
-    if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-
-    if not target_user:
-        # Try to find by username in DB
-        username_query = None
-        for word in message.text.split():
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        user_id = row[0]
-                        from aiogram.types import User
-                        target_user = User(id=user_id, is_bot=False, first_name=username_query)
-
+    target_user = await resolve_target(message)
     if not target_user:
-        await message.reply(i18n.get(lang_code, "user_not_found"))
+        await notify(message, i18n.get(lang_code, "user_not_found"), reply=True)
         return
 
     try:
@@ -311,39 +172,20 @@ async def unmute_handler(message: Message, user_role: str, lang_code: str):
                 can_invite_users=True
             )
         )
-        await message.reply(i18n.get(lang_code, "unmute_success", name=target_user.full_name))
+        await scheduler.cancel("unmute", message.chat.id, target_user.id)
+        await notify(message, i18n.get(lang_code, "unmute_success", name=target_user.full_name), reply=True)
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
-@router.message(lambda msg: msg.text and msg.text.split()[0] == "!mdelete")
+@commands.command("!mdelete")
 async def mdelete_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
-    target_user = None
-    if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-
-    if not target_user:
-        # Try to find by username in DB
-        username_query = None
-        for word in message.text.split():
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        user_id = row[0]
-                        from aiogram.types import User
-                        target_user = User(id=user_id, is_bot=False, first_name=username_query)
-
+    target_user = await resolve_target(message)
     if not target_user:
-        await message.reply(i18n.get(lang_code, "user_not_found"))
+        await notify(message, i18n.get(lang_code, "user_not_found"), reply=True)
         return
 
     try:
@@ -356,14 +198,14 @@ async def mdelete_handler(message: Message, user_role: str, lang_code: str):
             await message.delete() # Delete command
             # await message.answer(f"Сообщение от {target_user.full_name} удалено.") 
         else:
-             await message.reply(i18n.get(lang_code, "mdelete_no_kick_perm"))
+             await notify(message, i18n.get(lang_code, "mdelete_no_kick_perm"), reply=True)
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
-@router.message(lambda msg: msg.text and msg.text.split()[0] == "!setadmin")
+@commands.command("!setadmin")
 async def setadmin_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
     parts = message.text.split()
@@ -384,51 +226,27 @@ async def setadmin_handler(message: Message, user_role: str, lang_code: str):
              level = int(parts[1])
              text_without_level = parts[0]
         else:
-             await message.reply(i18n.get(lang_code, "invalid_level"))
+             await notify(message, i18n.get(lang_code, "invalid_level"), reply=True)
              return
 
     if level not in [0, 1, 2]:
-        await message.reply(i18n.get(lang_code, "invalid_level"))
+        await notify(message, i18n.get(lang_code, "invalid_level"), reply=True)
         return
 
     # Check Hierarchy Permissions
     if level == 2 and user_role != "owner":
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
     
     if level == 1 and user_role not in ["owner", "head_admin"]:
-         await message.reply(i18n.get(lang_code, "permission_denied"))
+         await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
          return
 
-    # Find User
-    if message.reply_to_message:
-        target_user = message.reply_to_message.from_user
-    elif message.entities:
-         for entity in message.entities:
-            if entity.type == "text_mention":
-                target_user = entity.user
-                break
-    
-    if not target_user:
-        # Try @username from parts (excluding level if we found it)
-        # Re-split text_without_level
-        sub_parts = message.text.split()[:-1] if level is not None else message.text.split()
-        username_query = None
-        for word in sub_parts:
-            if word.startswith("@"):
-                username_query = word[1:].lower()
-                break
-        
-        if username_query:
-            async with get_db() as db:
-                async with db.execute("SELECT user_id FROM users WHERE username = ? AND chat_id = ?", (username_query, message.chat.id)) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        from aiogram.types import User
-                        target_user = User(id=row[0], is_bot=False, first_name=username_query)
+    # Find User (the last argument is the level)
+    target_user = await resolve_target(message, parts[1:-1])
 
     if not target_user:
-        await message.reply(i18n.get(lang_code, "user_not_found"))
+        await notify(message, i18n.get(lang_code, "user_not_found"), reply=True)
         return
 
     # Execute Role Change
@@ -439,22 +257,23 @@ async def setadmin_handler(message: Message, user_role: str, lang_code: str):
     # Middleware checks handle execution permission based on caller's role.
     # But we should check target's current role too.
     
-    async with get_db() as db:
+    async with get_db(readonly=True) as db:
         # Check target current role
         target_role = "user"
         async with db.execute("SELECT role FROM users WHERE user_id = ? AND chat_id = ?", (target_user.id, message.chat.id)) as cursor:
              row = await cursor.fetchone()
              if row: target_role = row[0]
-        
-        # Hierarchy Protection
-        if target_role == "owner":
-             await message.reply(i18n.get(lang_code, "role_change_owner_fail"))
-             return
-        
-        if target_role == "head_admin" and user_role != "owner":
-             await message.reply(i18n.get(lang_code, "role_change_head_fail"))
-             return
 
+    # Hierarchy Protection (replies are sent outside get_db, they may wait for a rate limit token)
+    if target_role == "owner":
+         await notify(message, i18n.get(lang_code, "role_change_owner_fail"), reply=True)
+         return
+    
+    if target_role == "head_admin" and user_role != "owner":
+         await notify(message, i18n.get(lang_code, "role_change_head_fail"), reply=True)
+         return
+
+    async with get_db() as db:
         # Update
         await db.execute("INSERT OR REPLACE INTO users (user_id, chat_id, role, username) VALUES (?, ?, ?, ?) ON CONFLICT(user_id, chat_id) DO UPDATE SET role=excluded.role", 
                          (target_user.id, message.chat.id, new_role, target_user.first_name)) # Best effort username
@@ -477,8 +296,19 @@ async def setadmin_handler(message: Message, user_role: str, lang_code: str):
         await db.commit()
 
     if level == 0:
-        await message.reply(i18n.get(lang_code, "admin_demoted", name=target_user.full_name))
+        await notify(message, i18n.get(lang_code, "admin_demoted", name=target_user.full_name), reply=True)
     else:
         role_name_key = f"role_{new_role}"
         role_text = i18n.get(lang_code, role_name_key)
-        await message.reply(i18n.get(lang_code, "admin_promoted", name=target_user.full_name, role=role_text))
+        await notify(message, i18n.get(lang_code, "admin_promoted", name=target_user.full_name, role=role_text), reply=True)
+
+# Telegram lifts the restriction itself at until_date, these only record it
+@scheduler.job("unmute")
+async def mute_expired(bot, action: ScheduledAction):
+    from utils.logger import log_action
+    await log_action(bot, action.chat_id, "Mute expired", f"User: {action.data.get('name')} (ID: {action.target_id})")
+
+@scheduler.job("unban")
+async def ban_expired(bot, action: ScheduledAction):
+    from utils.logger import log_action
+    await log_action(bot, action.chat_id, "Ban expired", f"User: {action.data.get('name')} (ID: {action.target_id})")
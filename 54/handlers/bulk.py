@@ -0,0 +1,144 @@
+from aiogram.types import Message, ChatPermissions
+from datetime import datetime, timedelta
+from html import escape
+
+from utils.i18n import i18n
+from utils.commands import commands
+from utils.bulk import run_bulk
+from utils.targets import target_resolver, get_roles, recent_members
+from utils.time_parser import parse_time
+from utils.scheduler import scheduler
+from utils.admin_roster import admin_roster
+from utils.api_executor import notify
+from utils.logger import log_action
+from database.chat_settings import get_chat_settings
+
+# Users acted on by one bulk command
+BULK_MAX_TARGETS = 200
+# Names listed per line of the report
+REPORT_MAX_NAMES = 30
+
+ADMIN_ROLES = ["owner", "head_admin", "helper"]
+
+def _names(names: list) -> str:
+    text = ", ".join(escape(str(name)) for name in names[:REPORT_MAX_NAMES])
+    if len(names) > REPORT_MAX_NAMES:
+        text += f" (+{len(names) - REPORT_MAX_NAMES})"
+    return text
+
+# !mkick / !mban / !mmute @user1 @user2 ... [time]
+# !mban new 10m [time] - everyone who joined in the last 10 minutes
+@commands.command("!mkick", "!mban", "!mmute")
+async def bulk_handler(message: Message, user_role: str, lang_code: str, command_name: str):
+    if user_role not in ["owner", "head_admin"]:
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
+        return
+
+    chat_id = message.chat.id
+    usernames = []
+    joined_within = None
+    duration = None
+
+    tokens = message.text.split()[1:]
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.lower() == "new" and i + 1 < len(tokens):
+            joined_within = parse_time(tokens[i + 1])
+            i += 1
+        elif token.startswith("@") and len(token) > 1:
+            usernames.append(token)
+        else:
+            duration = parse_time(token) or duration
+        i += 1
+
+    # user_id -> display name
+    targets = {}
+    if message.reply_to_message and message.reply_to_message.from_user:
+        targets[message.reply_to_message.from_user.id] = message.reply_to_message.from_user.full_name
+    for entity in message.entities or []:
+        if entity.type == "text_mention" and entity.user:
+            targets[entity.user.id] = entity.user.full_name
+
+    # All @usernames in a single query
+    found = await target_resolver.resolve_many(chat_id, usernames)
+    not_found = [name for name in usernames if name.lower().lstrip("@") not in found]
+    for username, user_id in found.items():
+        targets[user_id] = f"@{username}"
+
+    if joined_within:
+        members = await recent_members(chat_id, max(int(joined_within.total_seconds() // 60), 1))
+        for user_id, username in members.items():
+            targets.setdefault(user_id, f"@{username}" if username else str(user_id))
+
+    if not targets and not not_found:
+        await notify(message, i18n.get(lang_code, "bulk_usage", command=command_name), reply=True)
+        return
+
+    # Never touch admins, the issuer or the bot itself
+    roster = await admin_roster.get(message.bot, chat_id)
+    roles = await get_roles(chat_id, list(targets))
+    skipped = [
+        user_id for user_id in targets
+        if user_id in (message.from_user.id, message.bot.id)
+        or roles.get(user_id) in ADMIN_ROLES
+        or roster.get(user_id) in ("creator", "administrator")
+    ]
+    for user_id in skipped:
+        targets.pop(user_id)
+
+    user_ids = list(targets)
+    truncated = len(user_ids) > BULK_MAX_TARGETS
+    user_ids = user_ids[:BULK_MAX_TARGETS]
+
+    chat_settings = await get_chat_settings(chat_id)
+    bot = message.bot
+    until_date = None
+
+    if command_name == "!mkick":
+        action_name = i18n.get(lang_code, "val_kick")
+
+        async def call(user_id):
+            await bot.ban_chat_member(chat_id, user_id, revoke_messages=chat_settings.delete_on_kick)
+            await bot.unban_chat_member(chat_id, user_id)
+    elif command_name == "!mban":
+        action_name = i18n.get(lang_code, "val_ban")
+        until_date = datetime.now() + duration if duration else None
+
+        async def call(user_id):
+            await bot.ban_chat_member(chat_id, user_id, until_date=until_date, revoke_messages=chat_settings.delete_on_ban)
+    else:
+        action_name = i18n.get(lang_code, "val_mute")
+        # Same bounds as !mute
+        duration = min(max(duration or timedelta(hours=1), timedelta(seconds=60)), timedelta(days=90))
+        until_date = datetime.now() + duration
+
+        async def call(user_id):
+            await bot.restrict_chat_member(chat_id, user_id, ChatPermissions(can_send_messages=False), until_date=until_date)
+
+    done, failed = await run_bulk(call, user_ids)
+
+    if done and command_name != "!mkick":
+        kind = "unban" if command_name == "!mban" else "unmute"
+        if until_date:
+            # Replaces the expiry of an earlier temporary ban or mute
+            await scheduler.schedule_many(kind, chat_id, [(user_id, {"name": targets[user_id]}) for user_id in done], until_date)
+        else:
+            # Permanent now: an older temporary ban's timer must not fire
+            await scheduler.cancel_many(kind, chat_id, done)
+
+    lines = [i18n.get(lang_code, "bulk_report", action=action_name, done=len(done), total=len(user_ids))]
+    if not_found:
+        lines.append(i18n.get(lang_code, "bulk_not_found", names=_names(not_found)))
+    if skipped:
+        lines.append(i18n.get(lang_code, "bulk_skipped", count=len(skipped)))
+    if failed:
+        lines.append(i18n.get(lang_code, "bulk_failed", names=_names([f"{targets[user_id]} ({error})" for user_id, error in failed.items()])))
+    if truncated:
+        lines.append(i18n.get(lang_code, "bulk_truncated", limit=BULK_MAX_TARGETS))
+    await notify(message, "\n".join(lines), reply=True)
+
+    if done:
+        await log_action(bot, chat_id, f"Bulk {action_name}",
+                         f"Users ({len(done)}): {_names([targets[user_id] for user_id in done])}\n"
+                         f"Until: {until_date}\nAdmin: {message.from_user.full_name}")
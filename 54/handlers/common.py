@@ -1,7 +1,9 @@
 from aiogram import Router, F
 from aiogram.types import Message
 from utils.i18n import i18n
+from utils.api_executor import notify
 from database.manager import get_db
+from database.chat_settings import invalidate_chat_settings
 
 router = Router()
 
@@ -14,26 +16,30 @@ async def start_handler(message: Message, lang_code: str):
         async with db.execute("SELECT owner_id FROM chats WHERE chat_id = ?", (chat_id,)) as cursor:
             row = await cursor.fetchone()
             
-            if not row or row[0] is None:
-                # Set the first user as owner
-                await db.execute("""
-                    INSERT INTO chats (chat_id, owner_id) 
-                    VALUES (?, ?)
-                    ON CONFLICT(chat_id) DO UPDATE SET owner_id = ?
-                """, (chat_id, user_id, user_id))
-                
-                # Also update their role in the users table
-                await db.execute("""
-                    INSERT INTO users (user_id, chat_id, role)
-                    VALUES (?, ?, 'owner')
-                    ON CONFLICT(user_id, chat_id) DO UPDATE SET role = 'owner'
-                """, (user_id, chat_id))
-                
-                await db.commit()
-                # Ideally utilize lang_code here too
-                await message.reply(i18n.get(lang_code, "start_owner_success"))
-            else:
-                await message.reply(i18n.get(lang_code, "start_owner_fail"))
+        claimed = not row or row[0] is None
+        if claimed:
+            # Set the first user as owner
+            await db.execute("""
+                INSERT INTO chats (chat_id, owner_id) 
+                VALUES (?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET owner_id = ?
+            """, (chat_id, user_id, user_id))
+            
+            # Also update their role in the users table
+            await db.execute("""
+                INSERT INTO users (user_id, chat_id, role)
+                VALUES (?, ?, 'owner')
+                ON CONFLICT(user_id, chat_id) DO UPDATE SET role = 'owner'
+            """, (user_id, chat_id))
+            
+            await db.commit()
+
+    # Replied outside the DB block: the reply may wait for a rate limit token
+    if claimed:
+        invalidate_chat_settings(chat_id)
+        await notify(message, i18n.get(lang_code, "start_owner_success"), reply=True)
+    else:
+        await notify(message, i18n.get(lang_code, "start_owner_fail"), reply=True)
 
 @router.message(F.text == "!help")
 async def help_handler(message: Message, user_role: str, lang_code: str):
@@ -60,16 +66,16 @@ async def help_handler(message: Message, user_role: str, lang_code: str):
     if text == help_key: 
         text = i18n.get(lang_code, "help_text")
         
-    await message.reply(text)
+    await notify(message, text, reply=True)
 
 @router.message(F.text == "!ahelp")
 async def ahelp_handler(message: Message, lang_code: str):
     text = i18n.get(lang_code, "ahelp_text")
-    await message.reply(text)
+    await notify(message, text, reply=True)
 
 @router.message(F.text.startswith("!"))
 async def unknown_command(message: Message, lang_code: str):
     # Only if it wasn't caught by other routers
     # Need to handle case where lang_code might be missing if middleware fails?
     # But middleware is global.
-    await message.reply(i18n.get(lang_code, "command_not_found"))
+    await notify(message, i18n.get(lang_code, "command_not_found"), reply=True)
@@ -0,0 +1,50 @@
+from html import escape
+from datetime import datetime
+
+from aiogram.types import Message
+
+import config
+from database.manager import query_stats
+from utils.commands import commands
+from utils.i18n import i18n
+from utils.api_executor import notify
+
+SQLTOP_DEFAULT = 10
+SQLTOP_MAX = 20
+# Long statements are cut so the whole list fits in one message
+SQLTOP_STATEMENT_CHARS = 300
+
+@commands.command("!sqltop")
+async def sqltop_handler(message: Message, user_role: str, lang_code: str):
+    """
+    !sqltop [n] - slowest statements by total time; !sqltop reset - start counting again.
+    The stats cover every chat the bot serves, so only the bot owner (OWNER_ID) may see them.
+    """
+    if message.from_user.id != config.OWNER_ID:
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
+        return
+
+    parts = message.text.split()
+    if len(parts) > 1 and parts[1].lower() == "reset":
+        query_stats.reset()
+        await notify(message, i18n.get(lang_code, "sqltop_reset"), reply=True)
+        return
+
+    n = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else SQLTOP_DEFAULT
+    rows = query_stats.top(max(1, min(n, SQLTOP_MAX)))
+    if not rows:
+        await notify(message, i18n.get(lang_code, "sqltop_empty"), reply=True)
+        return
+
+    since = datetime.fromtimestamp(query_stats.since).strftime("%Y-%m-%d %H:%M")
+    lines = [i18n.get(lang_code, "sqltop_header", count=len(rows), since=since)]
+    for i, (statement, calls, total, longest, slow) in enumerate(rows, 1):
+        if len(statement) > SQLTOP_STATEMENT_CHARS:
+            statement = statement[:SQLTOP_STATEMENT_CHARS] + "…"
+        lines.append(
+            f"\n<b>{i}.</b> {total * 1000:.1f} ms, {calls} calls, "
+            f"avg {total / calls * 1000:.2f} ms, max {longest * 1000:.1f} ms"
+            + (f", {slow} slow" if slow else "")
+            + f"\n<code>{escape(statement)}</code>"
+        )
+    await notify(message, "\n".join(lines), reply=True)
@@ -1,38 +1,85 @@
 from aiogram import Router, F
 from aiogram.types import ChatMemberUpdated, Message
 from aiogram.filters import ChatMemberUpdatedFilter, JOIN_TRANSITION
+from aiogram.exceptions import TelegramBadRequest
 from database.manager import get_db
+from database.chat_settings import get_chat_settings
+from utils.scheduler import scheduler, ScheduledAction
+from utils.raid_detector import raid_detector, raid_lockdown
 import asyncio
+import time
 
 router = Router()
 
+# Welcome messages are removed after this long
+WELCOME_DELETE_AFTER = 60  # seconds
+# Joins within this window after the first one share a single welcome message
+WELCOME_BATCH_WINDOW = 3  # seconds
+# Names listed in one welcome, the rest are counted
+WELCOME_MAX_NAMES = 20
+
+_pending_welcomes = {}  # chat_id -> list of member names waiting for a welcome
+_welcome_tasks = set()
+
 @router.chat_member(ChatMemberUpdatedFilter(JOIN_TRANSITION))
 async def on_user_join(event: ChatMemberUpdated):
     chat_id = event.chat.id
     new_member = event.new_chat_member.user
+
+    reason = raid_detector.record("join", chat_id)
+    if reason:
+        await raid_lockdown(event.bot, chat_id, reason)
     
-    # Add to DB immediately
+    # Add to DB immediately; a returning member gets a fresh join time
     async with get_db() as db:
         await db.execute(
-            "INSERT OR IGNORE INTO users (user_id, chat_id, role, username) VALUES (?, ?, 'user', ?)",
+            "INSERT INTO users (user_id, chat_id, role, username, joined_at) VALUES (?, ?, 'user', ?, CURRENT_TIMESTAMP) "
+            "ON CONFLICT (user_id, chat_id) DO UPDATE SET joined_at = excluded.joined_at",
             (new_member.id, chat_id, new_member.full_name) # Using full name as fallback for username
         )
         await db.commit()
-    
-        # Check for welcome message
-        welcome_text = None
-        async with db.execute("SELECT welcome_message FROM chats WHERE chat_id = ?", (chat_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row: welcome_text = row[0]
-            
-    if welcome_text:
-        # Replace placeholder
-        final_text = welcome_text.replace("{username}", new_member.full_name)
-        
-        try:
-            msg = await event.bot.send_message(chat_id, final_text)
-            # Auto-delete after 60s
-            await asyncio.sleep(60)
-            await msg.delete()
-        except Exception as e:
-            print(f"Welcome message error: {e}")
+
+    # Check for welcome message
+    if not (await get_chat_settings(chat_id)).welcome_message:
+        return
+
+    names = _pending_welcomes.get(chat_id)
+    if names is not None:
+        # A welcome for this chat is already being collected
+        names.append(new_member.full_name)
+        return
+
+    _pending_welcomes[chat_id] = [new_member.full_name]
+    task = asyncio.create_task(_send_welcome(event.bot, chat_id))
+    _welcome_tasks.add(task)
+    task.add_done_callback(_welcome_tasks.discard)
+
+async def _send_welcome(bot, chat_id: int):
+    await asyncio.sleep(WELCOME_BATCH_WINDOW)
+    names = _pending_welcomes.pop(chat_id)
+
+    welcome_text = (await get_chat_settings(chat_id)).welcome_message
+    if not welcome_text:
+        return
+
+    listed = ", ".join(names[:WELCOME_MAX_NAMES])
+    if len(names) > WELCOME_MAX_NAMES:
+        listed += f" (+{len(names) - WELCOME_MAX_NAMES})"
+
+    # Replace placeholder
+    final_text = welcome_text.replace("{username}", listed)
+
+    try:
+        msg = await bot.send_message(chat_id, final_text)
+        # Auto-delete later, from the shared scheduler instead of a sleeping handler
+        await scheduler.schedule("delete_message", chat_id, msg.message_id, time.time() + WELCOME_DELETE_AFTER)
+    except Exception as e:
+        print(f"Welcome message error: {e}")
+
+@scheduler.job("delete_message")
+async def delete_scheduled_message(bot, action: ScheduledAction):
+    try:
+        await bot.delete_message(action.chat_id, action.target_id)
+    except TelegramBadRequest:
+        # Already deleted by an admin, or older than 48h
+        pass
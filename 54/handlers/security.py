@@ -1,107 +1,100 @@
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import Command
+from datetime import datetime
 from database.manager import get_db
+from database.chat_settings import invalidate_chat_settings
+from database.banned_words import invalidate_word_matcher
+from database.link_rules import invalidate_link_policy
 from utils.i18n import i18n
 from utils.logger import log_action
+from utils.lockdown import apply_lockdown, lift_lockdown
+from utils.link_classifier import normalize_host
+from utils.time_parser import parse_time
+from utils.api_executor import notify
 
 router = Router()
 
-# 1.1 Lockdown (!lock / !unlock)
-@router.message(F.text == "!lock")
+# 1.1 Lockdown (!lock [time] / !unlock)
+@router.message((F.text == "!lock") | F.text.startswith("!lock "))
 async def lock_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
-    from aiogram.types import ChatPermissions
-    
-    # permissions=ChatPermissions(can_send_messages=False) makes it read-only for default role
+    # Optional duration, e.g. "!lock 30m": lockdown is lifted automatically
+    parts = message.text.split()
+    duration = parse_time(parts[1]) if len(parts) > 1 else None
+
     try:
-        await message.chat.set_permissions(ChatPermissions(can_send_messages=False))
-        
-        async with get_db() as db:
-            await db.execute("UPDATE chats SET lockdown_enabled = 1 WHERE chat_id = ?", (message.chat.id,))
-            await db.commit()
+        await apply_lockdown(message.bot, message.chat.id, datetime.now() + duration if duration else None)
             
-        await message.reply(i18n.get(lang_code, "lock_enabled"))
-        await log_action(message.bot, message.chat.id, "Lockdown", f"Enabled by {message.from_user.full_name}")
+        await notify(message, i18n.get(lang_code, "lock_enabled"), reply=True)
+        details = f"Enabled by {message.from_user.full_name}"
+        if duration:
+            details += f" for {duration}"
+        await log_action(message.bot, message.chat.id, "Lockdown", details)
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
 @router.message(F.text == "!unlock")
 async def unlock_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
-        
-    from aiogram.types import ChatPermissions
     
     try:
-        # Default permissions usually enable messages etc.
-        await message.chat.set_permissions(ChatPermissions(
-            can_send_messages=True,
-            can_send_audios=True,
-            can_send_documents=True,
-            can_send_photos=True,
-            can_send_videos=True,
-            can_send_video_notes=True,
-            can_send_voice_notes=True,
-            can_send_polls=True,
-            can_send_other_messages=True,
-            can_add_web_page_previews=True,
-            can_invite_users=True            
-        ))
-
-        async with get_db() as db:
-            await db.execute("UPDATE chats SET lockdown_enabled = 0 WHERE chat_id = ?", (message.chat.id,))
-            await db.commit()
+        await lift_lockdown(message.bot, message.chat.id)
             
-        await message.reply(i18n.get(lang_code, "unlock_enabled"))
+        await notify(message, i18n.get(lang_code, "unlock_enabled"), reply=True)
         await log_action(message.bot, message.chat.id, "Unlock", f"Disabled by {message.from_user.full_name}")
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
 # 1.2 Censor (!banword, !unbanword, !wordlist)
 @router.message(F.text.startswith("!banword"))
 async def banword_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
         
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
-        await message.reply(i18n.get(lang_code, "banword_usage"))
+        await notify(message, i18n.get(lang_code, "banword_usage"), reply=True)
         return
         
     word = parts[1].lower().strip()
     if not word:
-        await message.reply(i18n.get(lang_code, "banword_usage"))
+        await notify(message, i18n.get(lang_code, "banword_usage"), reply=True)
         return
 
     async with get_db() as db:
         async with db.execute("SELECT 1 FROM banned_words WHERE chat_id = ? AND word = ?", (message.chat.id, word)) as cursor:
-            if await cursor.fetchone():
-               await message.reply(i18n.get(lang_code, "banword_exists", word=word))
-               return
+            exists = await cursor.fetchone() is not None
 
-        await db.execute("INSERT OR IGNORE INTO banned_words (chat_id, word) VALUES (?, ?)", (message.chat.id, word))
-        await db.commit()
-        await db.execute("UPDATE chats SET censor_enabled = 1 WHERE chat_id = ?", (message.chat.id,))
-        await db.commit()
+        if not exists:
+            await db.execute("INSERT OR IGNORE INTO banned_words (chat_id, word) VALUES (?, ?)", (message.chat.id, word))
+            await db.commit()
+            await db.execute("UPDATE chats SET censor_enabled = 1 WHERE chat_id = ?", (message.chat.id,))
+            await db.commit()
+    if exists:
+        await notify(message, i18n.get(lang_code, "banword_exists", word=word), reply=True)
+        return
+    invalidate_chat_settings(message.chat.id)
+    invalidate_word_matcher(message.chat.id)
         
-    await message.reply(i18n.get(lang_code, "banword_added", word=word))
+    await notify(message, i18n.get(lang_code, "banword_added", word=word), reply=True)
     await log_action(message.bot, message.chat.id, "Censor Update", f"Word '{word}' added by {message.from_user.full_name}")
 
 @router.message(F.text.startswith(("!unbanword", "!rmword")))
 async def unbanword_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
 
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
-        await message.reply(i18n.get(lang_code, "banword_usage"))
+        await notify(message, i18n.get(lang_code, "banword_usage"), reply=True)
         return
         
     word = parts[1].lower()
@@ -109,17 +102,18 @@ async def unbanword_handler(message: Message, user_role: str, lang_code: str):
     async with get_db() as db:
         await db.execute("DELETE FROM banned_words WHERE chat_id = ? AND word = ?", (message.chat.id, word))
         await db.commit()
+    invalidate_word_matcher(message.chat.id)
         
-    await message.reply(i18n.get(lang_code, "banword_removed", word=word))
+    await notify(message, i18n.get(lang_code, "banword_removed", word=word), reply=True)
     await log_action(message.bot, message.chat.id, "Censor Update", f"Word '{word}' removed by {message.from_user.full_name}")
 
 @router.message(F.text.in_({"!wordlist", "!banlist"}))
 async def wordlist_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
         
-    async with get_db() as db:
+    async with get_db(readonly=True) as db:
         async with db.execute("SELECT word FROM banned_words WHERE chat_id = ?", (message.chat.id,)) as cursor:
             rows = await cursor.fetchall()
             words = [row[0] for row in rows]
@@ -131,6 +125,74 @@ async def wordlist_handler(message: Message, user_role: str, lang_code: str):
         
     try:
         await message.bot.send_message(message.from_user.id, text)
-        await message.reply(i18n.get(lang_code, "wordlist_sent_pm"))
+        await notify(message, i18n.get(lang_code, "wordlist_sent_pm"), reply=True)
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
+
+# 1.3 Anti-link (!antilink on|off, !allowlink, !denylink, !rmlink, !linklist)
+@router.message(F.text.startswith("!antilink"))
+async def antilink_handler(message: Message, user_role: str, lang_code: str):
+    if user_role not in ["owner", "head_admin"]:
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
+        return
+
+    parts = message.text.split()
+    if len(parts) != 2 or parts[1].lower() not in ("on", "off"):
+        await notify(message, i18n.get(lang_code, "antilink_usage"), reply=True)
+        return
+
+    enabled = parts[1].lower() == "on"
+    async with get_db() as db:
+        await db.execute("UPDATE chats SET antilink_enabled = ? WHERE chat_id = ?", (int(enabled), message.chat.id))
+        await db.commit()
+    invalidate_chat_settings(message.chat.id)
+
+    await notify(message, i18n.get(lang_code, "antilink_on" if enabled else "antilink_off"), reply=True)
+    await log_action(message.bot, message.chat.id, "Anti-Link", f"{'Enabled' if enabled else 'Disabled'} by {message.from_user.full_name}")
+
+@router.message(F.text.startswith(("!allowlink", "!denylink", "!rmlink")))
+async def linkrule_handler(message: Message, user_role: str, lang_code: str):
+    if user_role not in ["owner", "head_admin"]:
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
+        return
+
+    parts = message.text.split()
+    # Accepts bare domains as well as pasted links ("https://www.example.com/page")
+    domain = normalize_host(parts[1]) if len(parts) == 2 else None
+    if not domain or "." not in domain:
+        await notify(message, i18n.get(lang_code, "linkrule_usage"), reply=True)
+        return
+
+    command = parts[0].lower()
+    async with get_db() as db:
+        if command == "!rmlink":
+            await db.execute("DELETE FROM link_rules WHERE chat_id = ? AND domain = ?", (message.chat.id, domain))
+        else:
+            await db.execute(
+                "INSERT OR REPLACE INTO link_rules (chat_id, domain, allowed) VALUES (?, ?, ?)",
+                (message.chat.id, domain, int(command == "!allowlink"))
+            )
+        await db.commit()
+    invalidate_link_policy(message.chat.id)
+
+    key = {"!allowlink": "linkrule_allowed", "!denylink": "linkrule_denied"}.get(command, "linkrule_removed")
+    await notify(message, i18n.get(lang_code, key, domain=domain), reply=True)
+    await log_action(message.bot, message.chat.id, "Anti-Link Update", f"{command} {domain} by {message.from_user.full_name}")
+
+@router.message(F.text == "!linklist")
+async def linklist_handler(message: Message, user_role: str, lang_code: str):
+    if user_role not in ["owner", "head_admin"]:
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
+        return
+
+    async with get_db(readonly=True) as db:
+        async with db.execute(
+            "SELECT domain, allowed FROM link_rules WHERE chat_id = ? ORDER BY domain", (message.chat.id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    if rows:
+        rules = "\n".join(f"{'+' if allowed else '-'} {domain}" for domain, allowed in rows)
+        await notify(message, i18n.get(lang_code, "linkrule_list", rules=rules), reply=True)
+    else:
+        await notify(message, i18n.get(lang_code, "linkrule_empty"), reply=True)
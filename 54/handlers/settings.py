@@ -1,10 +1,11 @@
 from aiogram import Router, F
-import aiosqlite
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database.manager import get_db
+from database.chat_settings import ChatSettings, get_chat_settings, invalidate_chat_settings
 from utils.i18n import i18n
+from utils.api_executor import notify
 
 router = Router()
 
@@ -18,40 +19,23 @@ async def settings_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
         return
 
-    async with get_db() as db:
-        db.row_factory = aiosqlite.Row # Enable name access
-        async with db.execute("SELECT * FROM chats WHERE chat_id = ?", (message.chat.id,)) as cursor:
-            row = await cursor.fetchone()
-            if not row:
-                await db.execute("INSERT INTO chats (chat_id) VALUES (?)", (message.chat.id,))
-                await db.commit()
-                async with db.execute("SELECT * FROM chats WHERE chat_id = ?", (message.chat.id,)) as cursor:
-                    row = await cursor.fetchone()
-            
-            await message.reply(f"⚙️ <b>{i18n.get(lang_code, 'btn_punishment').split(':')[0]}:</b>", reply_markup=get_settings_keyboard(row, lang_code))
+    chat_settings = await get_chat_settings(message.chat.id)
+    if not chat_settings.exists:
+        async with get_db() as db:
+            await db.execute("INSERT OR IGNORE INTO chats (chat_id) VALUES (?)", (message.chat.id,))
+            await db.commit()
+        invalidate_chat_settings(message.chat.id)
+        chat_settings = await get_chat_settings(message.chat.id)
 
-def get_settings_keyboard(row, lang_code):
-    # row is aiosqlite.Row (supports index and key access)
-    # Safe fallback if not Row (e.g. legacy calls) but we updated handlers.
-    
-    # Extract values safely
-    try:
-        limit = row["warn_limit"]
-        punishment = row["warn_punishment"]
-        del_ban = row["delete_on_ban"]
-        del_kick = row["delete_on_kick"]
-        del_mute = row["delete_on_mute"]
-        # can_setname = row["users_can_setname"] # Not used in main menu? Added in previous versions?
-        chat_lang = row["language"]
-    except (TypeError, IndexError, KeyError):
-        # Fallback to indices if something breaks or old code
-        # 0:chat_id, 1:lang, 2:limit, 3:punish, 4:del_ban, 5:del_kick, 6:del_mute
-        chat_lang = row[1]
-        limit = row[2]
-        punishment = row[3]
-        del_ban = row[4]
-        del_kick = row[5]
-        del_mute = row[6]
+    await notify(message, f"⚙️ <b>{i18n.get(lang_code, 'btn_punishment').split(':')[0]}:</b>", reply=True, reply_markup=get_settings_keyboard(chat_settings, lang_code))
+
+def get_settings_keyboard(chat_settings: ChatSettings, lang_code):
+    limit = chat_settings.warn_limit
+    punishment = chat_settings.warn_punishment
+    del_ban = chat_settings.delete_on_ban
+    del_kick = chat_settings.delete_on_kick
+    del_mute = chat_settings.delete_on_mute
+    chat_lang = chat_settings.language
 
     # Format punishment display
     punish_display = punishment
@@ -105,11 +89,11 @@ async def set_language(callback: CallbackQuery, user_role: str, state: FSMContex
     async with get_db() as db:
         await db.execute("UPDATE chats SET language = ? WHERE chat_id = ?", (new_lang, callback.message.chat.id))
         await db.commit()
-        
-        async with db.execute("SELECT * FROM chats WHERE chat_id = ?", (callback.message.chat.id,)) as cursor:
-            row = await cursor.fetchone()
-            # Use new_lang to display menu
-            await callback.message.edit_text("⚙️", reply_markup=get_settings_keyboard(row, new_lang))
+    invalidate_chat_settings(callback.message.chat.id)
+
+    # Use new_lang to display menu
+    chat_settings = await get_chat_settings(callback.message.chat.id)
+    await callback.message.edit_text("⚙️", reply_markup=get_settings_keyboard(chat_settings, new_lang))
     
     await callback.answer(f"Language set to {new_lang.upper()}")
 
@@ -121,21 +105,22 @@ async def set_warn_limit_prompt(callback: CallbackQuery, user_role: str, lang_co
         return
     
     await state.set_state(SettingsStates.waiting_for_limit)
-    await callback.message.answer(i18n.get(lang_code, "msg_enter_limit"))
+    await notify(callback.message, i18n.get(lang_code, "msg_enter_limit"))
     await callback.answer()
 
 @router.message(SettingsStates.waiting_for_limit)
 async def limit_input(message: Message, state: FSMContext, lang_code: str):
     if not message.text.isdigit():
-        await message.reply(i18n.get(lang_code, "msg_invalid_input"))
+        await notify(message, i18n.get(lang_code, "msg_invalid_input"), reply=True)
         return
     
     limit = int(message.text)
     async with get_db() as db:
         await db.execute("UPDATE chats SET warn_limit = ? WHERE chat_id = ?", (limit, message.chat.id))
         await db.commit()
+    invalidate_chat_settings(message.chat.id)
     
-    await message.reply(i18n.get(lang_code, "msg_limit_updated", limit=limit))
+    await notify(message, i18n.get(lang_code, "msg_limit_updated", limit=limit), reply=True)
     await state.clear()
 
 # --- Punishment ---
@@ -157,7 +142,8 @@ async def set_punish_kick(callback: CallbackQuery, lang_code: str):
     async with get_db() as db:
         await db.execute("UPDATE chats SET warn_punishment = 'kick' WHERE chat_id = ?", (callback.message.chat.id,))
         await db.commit()
-        await callback_to_main(callback, db, lang_code)
+    invalidate_chat_settings(callback.message.chat.id)
+    await callback_to_main(callback, lang_code)
 
 @router.callback_query(F.data == "punish_ban_menu")
 async def punish_ban_menu(callback: CallbackQuery, lang_code: str):
@@ -173,18 +159,19 @@ async def set_punish_ban_perm(callback: CallbackQuery, lang_code: str):
     async with get_db() as db:
         await db.execute("UPDATE chats SET warn_punishment = 'ban' WHERE chat_id = ?", (callback.message.chat.id,))
         await db.commit()
-        await callback_to_main(callback, db, lang_code)
+    invalidate_chat_settings(callback.message.chat.id)
+    await callback_to_main(callback, lang_code)
 
 @router.callback_query(F.data == "punish_ban_temp")
 async def set_punish_ban_temp_prompt(callback: CallbackQuery, state: FSMContext, lang_code: str):
     await state.set_state(SettingsStates.waiting_for_ban_duration)
-    await callback.message.answer(i18n.get(lang_code, "msg_enter_days"))
+    await notify(callback.message, i18n.get(lang_code, "msg_enter_days"))
     await callback.answer()
 
 @router.message(SettingsStates.waiting_for_ban_duration)
 async def duration_input(message: Message, state: FSMContext, lang_code: str):
     if not message.text.isdigit():
-        await message.reply(i18n.get(lang_code, "msg_invalid_input"))
+        await notify(message, i18n.get(lang_code, "msg_invalid_input"), reply=True)
         return
     
     days = int(message.text)
@@ -194,15 +181,15 @@ async def duration_input(message: Message, state: FSMContext, lang_code: str):
     async with get_db() as db:
         await db.execute("UPDATE chats SET warn_punishment = ? WHERE chat_id = ?", (punishment_val, message.chat.id))
         await db.commit()
+    invalidate_chat_settings(message.chat.id)
         
-    await message.reply(i18n.get(lang_code, "msg_punish_updated", punishment=f"Ban {days} days"))
+    await notify(message, i18n.get(lang_code, "msg_punish_updated", punishment=f"Ban {days} days"), reply=True)
     await state.clear()
 
 # --- Common ---
 @router.callback_query(F.data == "back_to_settings")
 async def back_to_settings(callback: CallbackQuery, lang_code: str):
-    async with get_db() as db:
-        await callback_to_main(callback, db, lang_code)
+    await callback_to_main(callback, lang_code)
 
 @router.callback_query(F.data.startswith("toggle_"))
 async def toggle_setting(callback: CallbackQuery, user_role: str, lang_code: str):
@@ -216,30 +203,26 @@ async def toggle_setting(callback: CallbackQuery, user_role: str, lang_code: str
     async with get_db() as db:
         await db.execute(f"UPDATE chats SET {field} = 1 - {field} WHERE chat_id = ?", (callback.message.chat.id,))
         await db.commit()
-        await callback_to_main(callback, db, lang_code)
+    invalidate_chat_settings(callback.message.chat.id)
+    await callback_to_main(callback, lang_code)
     await callback.answer()
 
 @router.callback_query(F.data == "close_settings")
 async def close_settings(callback: CallbackQuery):
     await callback.message.delete()
 
-async def callback_to_main(callback, db, lang_code):
-    db.row_factory = aiosqlite.Row
-    async with db.execute("SELECT * FROM chats WHERE chat_id = ?", (callback.message.chat.id,)) as cursor:
-            row = await cursor.fetchone()
-            await callback.message.edit_text("⚙️", reply_markup=get_settings_keyboard(row, lang_code))
+async def callback_to_main(callback, lang_code):
+    chat_settings = await get_chat_settings(callback.message.chat.id)
+    await callback.message.edit_text("⚙️", reply_markup=get_settings_keyboard(chat_settings, lang_code))
 
 # --- Censor Settings ---
 @router.callback_query(F.data == "set_censor")
 async def censor_settings_menu(callback: CallbackQuery, lang_code: str):
-    async with get_db() as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT censor_punishment, censor_punish_duration FROM chats WHERE chat_id = ?", (callback.message.chat.id,)) as cursor:
-            row = await cursor.fetchone()
-            if not row: return # Should not happen
-            
-            punishment = row["censor_punishment"]
-            duration = row["censor_punish_duration"]
+    chat_settings = await get_chat_settings(callback.message.chat.id)
+    if not chat_settings.exists: return # Should not happen
+
+    punishment = chat_settings.censor_punishment
+    duration = chat_settings.censor_punish_duration
             
     # Format
     p_display = punishment
@@ -264,30 +247,27 @@ async def censor_settings_menu(callback: CallbackQuery, lang_code: str):
 @router.callback_query(F.data == "set_censor_punish")
 async def toggle_censor_punish(callback: CallbackQuery, lang_code: str):
     # Toggle Mute -> Warn -> None -> Mute
+    current = (await get_chat_settings(callback.message.chat.id)).censor_punishment
+    next_map = {"mute": "warn", "warn": "none", "none": "mute"}
+    new_val = next_map.get(current, "mute")
+
     async with get_db() as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT censor_punishment FROM chats WHERE chat_id = ?", (callback.message.chat.id,)) as cursor:
-             row = await cursor.fetchone()
-             
-        current = row["censor_punishment"]
-        next_map = {"mute": "warn", "warn": "none", "none": "mute"}
-        new_val = next_map.get(current, "mute")
-        
         await db.execute("UPDATE chats SET censor_punishment = ? WHERE chat_id = ?", (new_val, callback.message.chat.id))
         await db.commit()
-        
+    invalidate_chat_settings(callback.message.chat.id)
+
     await censor_settings_menu(callback, lang_code)
 
 @router.callback_query(F.data == "set_censor_time")
 async def set_censor_time_prompt(callback: CallbackQuery, state: FSMContext, lang_code: str):
     await state.set_state(SettingsStates.waiting_for_censor_time)
-    await callback.message.answer(i18n.get(lang_code, "msg_censor_time"))
+    await notify(callback.message, i18n.get(lang_code, "msg_censor_time"))
     await callback.answer()
 
 @router.message(SettingsStates.waiting_for_censor_time)
 async def censor_time_input(message: Message, state: FSMContext, lang_code: str):
     if not message.text.isdigit():
-        await message.reply(i18n.get(lang_code, "msg_invalid_input"))
+        await notify(message, i18n.get(lang_code, "msg_invalid_input"), reply=True)
         return
     
     minutes = int(message.text)
@@ -298,8 +278,9 @@ async def censor_time_input(message: Message, state: FSMContext, lang_code: str)
     async with get_db() as db:
         await db.execute("UPDATE chats SET censor_punish_duration = ? WHERE chat_id = ?", (seconds, message.chat.id))
         await db.commit()
+    invalidate_chat_settings(message.chat.id)
         
-    await message.reply(i18n.get(lang_code, "msg_limit_updated", limit=f"{minutes} min")) # Reuse or new msg? "Time updated"
+    await notify(message, i18n.get(lang_code, "msg_limit_updated", limit=f"{minutes} min"), reply=True) # Reuse or new msg? "Time updated"
     # User might want specific msg. Reusing limit updated is okay-ish but "Time updated" is better.
     # But I didn't add "msg_time_updated". I will reuse punishment updated? 
     # "Punishment updated to: 10 min mute"
@@ -1,8 +1,11 @@
 from aiogram import Router, F
 from aiogram.types import Message
 from database.manager import get_db
+from database.chat_settings import get_chat_settings, invalidate_chat_settings
+from database.stats_buffer import stats_buffer
 from utils.i18n import i18n
 from utils.logger import log_action
+from utils.api_executor import notify
 
 router = Router()
 
@@ -10,12 +13,12 @@ router = Router()
 @router.message(F.text.startswith("!setwelcome"))
 async def setwelcome_handler(message: Message, user_role: str, lang_code: str):
     if user_role not in ["owner", "head_admin"]:
-        await message.reply(i18n.get(lang_code, "permission_denied"))
+        await notify(message, i18n.get(lang_code, "permission_denied"), reply=True)
         return
         
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
-        await message.reply(i18n.get(lang_code, "welcome_usage"))
+        await notify(message, i18n.get(lang_code, "welcome_usage"), reply=True)
         return
         
     text = parts[1]
@@ -23,26 +26,23 @@ async def setwelcome_handler(message: Message, user_role: str, lang_code: str):
     async with get_db() as db:
         await db.execute("UPDATE chats SET welcome_message = ? WHERE chat_id = ?", (text, message.chat.id))
         await db.commit()
+    invalidate_chat_settings(message.chat.id)
         
-    await message.reply(i18n.get(lang_code, "welcome_set"))
+    await notify(message, i18n.get(lang_code, "welcome_set"), reply=True)
     await log_action(message.bot, message.chat.id, "Welcome Update", f"Set by {message.from_user.full_name}")
 
 # 2.2 Report System (!report)
 @router.message(F.text == "!report")
 async def report_handler(message: Message, user_role: str, lang_code: str):
     if not message.reply_to_message:
-        await message.reply(i18n.get(lang_code, "report_reply"))
+        await notify(message, i18n.get(lang_code, "report_reply"), reply=True)
         return
         
     reported_msg = message.reply_to_message
     reporter = message.from_user
     
     # Check if log channel exists
-    log_channel_id = None
-    async with get_db() as db:
-        async with db.execute("SELECT log_channel_id FROM chats WHERE chat_id = ?", (message.chat.id,)) as cursor:
-            row = await cursor.fetchone()
-            if row: log_channel_id = row[0]
+    log_channel_id = (await get_chat_settings(message.chat.id)).log_channel_id
             
     try:
         if log_channel_id:
@@ -53,22 +53,25 @@ async def report_handler(message: Message, user_role: str, lang_code: str):
                    f"💬 <b>Message:</b> {reported_msg.text or '[Media]'}\n" \
                    f"🔗 <a href='{reported_msg.get_url()}'>Go to message</a>"
             await message.bot.send_message(log_channel_id, text)
-            await message.reply(i18n.get(lang_code, "report_sent"))
+            await notify(message, i18n.get(lang_code, "report_sent"), reply=True)
         else:
             # Fallback: Tag admins in chat? Or DM?
             # Creating a report list for Admins usually requires storing admin IDs.
             # Best effort: Mention admins silently or just reply "Admins notified" (Placeholder)
             # Or fetch all "head_admin/owner/helper" from DB and DM them?
-            await message.reply(i18n.get(lang_code, "report_sent"))
+            await notify(message, i18n.get(lang_code, "report_sent"), reply=True)
     except Exception as e:
-        await message.reply(i18n.get(lang_code, "error_generic", error=str(e)))
+        await notify(message, i18n.get(lang_code, "error_generic", error=str(e)), reply=True)
 
 # 2.3 Activity Top (!top)
 @router.message(F.text == "!top")
 async def top_handler(message: Message, lang_code: str):
     chat_id = message.chat.id
+
+    # Make sure buffered message counts are visible
+    await stats_buffer.flush()
     
-    async with get_db() as db:
+    async with get_db(readonly=True) as db:
         async with db.execute(
             "SELECT username, message_count FROM users WHERE chat_id = ? ORDER BY message_count DESC LIMIT 10",
             (chat_id,)
@@ -76,7 +79,7 @@ async def top_handler(message: Message, lang_code: str):
             rows = await cursor.fetchall()
             
     if not rows:
-        await message.reply(i18n.get(lang_code, "top_no_data"))
+        await notify(message, i18n.get(lang_code, "top_no_data"), reply=True)
         return
         
     text = i18n.get(lang_code, "top_header")
@@ -90,4 +93,4 @@ async def top_handler(message: Message, lang_code: str):
         
         text += f"{idx}. {medal} <b>{name}</b> — {count} msgs\n"
         
-    await message.reply(text)
+    await notify(message, text, reply=True)
@@ -4,38 +4,58 @@ import sys
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 
 import config
-from database.manager import init_db
-from handlers import admin, user, warns, settings, common, security, social, events
+from database.manager import init_db, pool
+from database.stats_buffer import stats_buffer
+from database.fsm_storage import SQLiteStorage
+from handlers import admin, user, warns, settings, common, security, social, events, bulk, diagnostics
+from middlewares.context import ChatContextMiddleware
 from middlewares.role_check import RoleMiddleware
 from middlewares.stats_tracker import StatsMiddleware
 from middlewares.filter import FilterMiddleware
+from middlewares.raid_guard import RaidGuardMiddleware
+from middlewares.admin_roster import AdminRosterMiddleware
+from middlewares.metrics import UpdateMetricsMiddleware, TimedMiddleware, instrument_handlers
+from utils.api_executor import api_executor
+from utils.commands import commands
+from utils.logger import log_dispatcher
+from utils.metrics import start_metrics_server
+from utils.scheduler import scheduler
+from utils.warn_engine import start_warn_compaction
+from utils.webhook import run_webhook
+from utils.sharding import run_sharded
 
-async def main():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
-
-    # Initialize database
-    await init_db()
-
+def create_bot() -> Bot:
     bot = Bot(
         token=config.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    # Every outgoing call is rate limited and retried in one place
+    bot.session.middleware(api_executor)
+    return bot
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=SQLiteStorage())
 
     # Register Middlewares
-    dp.message.outer_middleware(RoleMiddleware())
-    dp.callback_query.outer_middleware(RoleMiddleware())
-    dp.message.outer_middleware(StatsMiddleware())
-    dp.message.outer_middleware(FilterMiddleware())
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    # ChatContextMiddleware does the single per-message DB read, the rest share its result.
+    # TimedMiddleware reports each one's own time to /metrics.
+    dp.message.outer_middleware(TimedMiddleware(ChatContextMiddleware()))
+    dp.callback_query.outer_middleware(TimedMiddleware(ChatContextMiddleware()))
+    dp.message.outer_middleware(TimedMiddleware(RoleMiddleware()))
+    dp.callback_query.outer_middleware(TimedMiddleware(RoleMiddleware()))
+    dp.message.outer_middleware(TimedMiddleware(StatsMiddleware()))
+    dp.message.outer_middleware(TimedMiddleware(RaidGuardMiddleware()))
+    dp.message.outer_middleware(TimedMiddleware(FilterMiddleware()))
+    dp.chat_member.outer_middleware(AdminRosterMiddleware())
+    dp.my_chat_member.outer_middleware(AdminRosterMiddleware())
 
     # Register Routers
+    # "!command" handlers from admin.py, warns.py and bulk.py, dispatched by a dict lookup
+    dp.include_router(commands.router)
     dp.include_router(admin.router)
     dp.include_router(settings.router)
     dp.include_router(security.router)
@@ -46,32 +66,58 @@ async def main():
     dp.include_router(common.router)
     # Logic in common.py: @router.message(F.text == "!help") ... @router.message(F.text.startswith("!")) -> unknown
     # So common.router MUST be LAST.
-    
-    # Remove common from top?
-    # In original file it was last:
-    # dp.include_router(admin.router)
-    # ...
-    # dp.include_router(common.router)
-    
-    # So I will re-add it at the end.
-    
-    # Current list in file:
-    # dp.include_router(admin.router)
-    # dp.include_router(user.router)
-    # dp.include_router(warns.router)
-    # dp.include_router(settings.router)
-    # dp.include_router(common.router)
-    
-    # I will replace the whole block.
 
+    # Handler latency for /metrics
+    instrument_handlers(dp)
+    return dp
+
+def get_allowed_updates(dp: Dispatcher) -> list[str]:
+    # my_chat_member has no handlers, but the admin roster still needs it
+    allowed_updates = dp.resolve_used_update_types()
+    for update_type in ("chat_member", "my_chat_member"):
+        if update_type not in allowed_updates:
+            allowed_updates.append(update_type)
+    return allowed_updates
+
+async def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    # Initialize database
+    await init_db()
+    await pool.open()
+    stats_buffer.start()
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    await scheduler.start(bot)
+    await start_warn_compaction()
+    metrics_runner = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT) if config.METRICS_PORT else None
 
     try:
-        await dp.start_polling(bot)
+        if config.BOT_MODE == "webhook":
+            await run_webhook(bot, dp, get_allowed_updates(dp))
+        else:
+            # getUpdates is refused while a webhook is registered (e.g. after running in webhook mode)
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=get_allowed_updates(dp))
     finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await scheduler.stop()
+        await log_dispatcher.close()
+        await dp.storage.close()
         await bot.session.close()
+        await stats_buffer.stop()
+        await pool.close()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if config.WORKERS > 1:
+            run_sharded(config.WORKERS)
+        else:
+            asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logging.error("Bot stopped!")
@@ -0,0 +1,26 @@
+from typing import Any, Callable, Dict, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import ChatMemberUpdated
+from utils.admin_roster import admin_roster
+
+class AdminRosterMiddleware(BaseMiddleware):
+    """
+    Keeps utils.admin_roster in sync with chat_member / my_chat_member updates,
+    so role checks rarely need to ask Telegram for the admin list.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[ChatMemberUpdated, Dict[str, Any]], Awaitable[Any]],
+        event: ChatMemberUpdated,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat_id = event.chat.id
+        member = event.new_chat_member
+
+        if member.user.id == event.bot.id and member.status in ("left", "kicked"):
+            # The bot itself was removed, the cached list is useless now
+            admin_roster.forget(chat_id)
+        else:
+            admin_roster.update_member(chat_id, member.user.id, member.status)
+
+        return await handler(event, data)
@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Awaitable, Union
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+from database.manager import get_db
+from database.chat_settings import ChatSettings, get_chat_settings
+from database.banned_words import get_word_matcher
+from database.link_rules import get_link_policy
+from utils.word_matcher import WordMatcher
+from utils.link_classifier import LinkPolicy
+
+@dataclass
+class ChatContext:
+    """Everything the message pipeline needs about the sender and the chat."""
+    chat_id: int
+    user_id: int
+    settings: ChatSettings
+    role: str | None = None  # None when the user has no users row yet
+    word_matcher: WordMatcher | None = None  # Only loaded when the censor is on
+    link_policy: LinkPolicy | None = None  # Only loaded when anti-link is on
+
+class ChatContextMiddleware(BaseMiddleware):
+    """
+    First stage of the pipeline: loads chat settings, the sender's users row,
+    the banned-word matcher and the link policy through one borrowed connection
+    and stores them in data["chat_context"] for RoleMiddleware, FilterMiddleware and handlers.
+    Settings, matcher and policy usually come from their caches, leaving a single SELECT.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[Union[Message, CallbackQuery], Dict[str, Any]], Awaitable[Any]],
+        event: Union[Message, CallbackQuery],
+        data: Dict[str, Any]
+    ) -> Any:
+        user = event.from_user
+
+        chat = None
+        if isinstance(event, Message):
+            chat = event.chat
+        elif isinstance(event, CallbackQuery) and event.message:
+            chat = event.message.chat
+
+        if not user or not chat:
+            return await handler(event, data)
+
+        async with get_db(readonly=True) as db:
+            settings = await get_chat_settings(chat.id, db=db)
+            context = ChatContext(chat_id=chat.id, user_id=user.id, settings=settings)
+
+            if settings.censor_enabled and isinstance(event, Message):
+                context.word_matcher = await get_word_matcher(chat.id, db=db)
+            if settings.antilink_enabled and isinstance(event, Message):
+                context.link_policy = await get_link_policy(chat.id, db=db)
+
+            async with db.execute(
+                "SELECT role FROM users WHERE user_id = ? AND chat_id = ?",
+                (user.id, chat.id)
+            ) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    context.role = row[0]
+
+        data["chat_context"] = context
+        return await handler(event, data)
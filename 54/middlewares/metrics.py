@@ -0,0 +1,74 @@
+import time
+from typing import Any, Callable, Dict, Awaitable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Update
+
+from utils.metrics import updates_total, update_seconds, middleware_seconds, handler_seconds
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outermost stage: counts every update by type and times the whole pipeline."""
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        event_type = event.event_type
+        result = UNHANDLED
+        start = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            return result
+        finally:
+            update_seconds.observe(time.perf_counter() - start, event_type)
+            updates_total.inc(event_type, "no" if result is UNHANDLED else "yes")
+
+class TimedMiddleware(BaseMiddleware):
+    """
+    Wraps another middleware and records only its own time:
+    the handlers and middlewares it awaits are subtracted.
+    """
+    def __init__(self, middleware: BaseMiddleware, name: str | None = None):
+        self.middleware = middleware
+        self.name = name or type(middleware).__name__
+
+    async def __call__(self, handler, event, data):
+        inner = 0.0
+
+        async def timed_handler(event, data):
+            nonlocal inner
+            start = time.perf_counter()
+            try:
+                return await handler(event, data)
+            finally:
+                inner += time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            return await self.middleware(timed_handler, event, data)
+        finally:
+            middleware_seconds.observe(time.perf_counter() - start - inner, self.name)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware, so it only runs once a handler matched.
+    "!commands" are labelled by command, everything else by the handler's function name.
+    """
+    async def __call__(self, handler, event, data):
+        label = data.get("command_name")
+        if label is None:
+            callback = data["handler"].callback
+            label = getattr(callback, "__name__", type(callback).__name__)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_seconds.observe(time.perf_counter() - start, label)
+
+def instrument_handlers(dp: Dispatcher):
+    """The dispatcher's inner middlewares also wrap the handlers of every included router."""
+    middleware = HandlerMetricsMiddleware()
+    for observer in (dp.message, dp.callback_query, dp.chat_member, dp.my_chat_member):
+        observer.middleware(middleware)
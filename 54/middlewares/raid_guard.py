@@ -0,0 +1,25 @@
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+from utils.raid_detector import raid_detector, raid_lockdown
+
+LINK_ENTITY_TYPES = {"url", "text_link"}
+
+class RaidGuardMiddleware(BaseMiddleware):
+    """Feeds message and link rates into the raid detector. Admins are not counted."""
+
+    async def __call__(self, handler, event, data):
+        if not isinstance(event, Message) or not event.from_user or event.from_user.is_bot:
+            return await handler(event, data)
+        if data.get("user_role", "user") in ["owner", "head_admin", "helper"]:
+            return await handler(event, data)
+
+        chat_id = event.chat.id
+        reason = raid_detector.record("message", chat_id)
+        entities = event.entities or event.caption_entities
+        if entities and any(entity.type in LINK_ENTITY_TYPES for entity in entities):
+            reason = raid_detector.record("link", chat_id) or reason
+
+        if reason:
+            await raid_lockdown(event.bot, chat_id, reason)
+
+        return await handler(event, data)
@@ -1,7 +1,8 @@
 from typing import Any, Callable, Dict, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message
-from database.manager import get_db
+from database.stats_buffer import stats_buffer
+from utils.targets import target_resolver
 
 class StatsMiddleware(BaseMiddleware):
     async def __call__(
@@ -19,15 +20,10 @@ class StatsMiddleware(BaseMiddleware):
         username = event.from_user.username
         if username:
             username = username.lower()
+        # Also called without a username, so a dropped @name stops resolving to this user
+        target_resolver.remember(chat_id, username, user_id)
 
-        async with get_db() as db:
-            await db.execute("""
-                INSERT INTO users (user_id, chat_id, username, message_count) 
-                VALUES (?, ?, ?, 1)
-                ON CONFLICT(user_id, chat_id) DO UPDATE SET 
-                    message_count = message_count + 1,
-                    username = COALESCE(excluded.username, users.username)
-            """, (user_id, chat_id, username))
-            await db.commit()
+        # Counted in memory and written in batches by stats_buffer
+        stats_buffer.add(user_id, chat_id, username)
 
         return await handler(event, data)
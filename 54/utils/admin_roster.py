@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+
+# How long a fetched administrator list is trusted without a chat_member update
+ROSTER_TTL = 600  # seconds
+
+ADMIN_STATUSES = ("creator", "administrator")
+
+class AdminRoster:
+    """
+    Per-chat cache of Telegram administrators: chat_id -> {user_id: status}.
+    Concurrent lookups for the same chat share a single get_chat_administrators call,
+    and chat_member updates keep the cached list current between refreshes.
+    """
+
+    def __init__(self, ttl: float = ROSTER_TTL):
+        self.ttl = ttl
+        self._rosters = {}  # chat_id -> (expires_at, {user_id: status})
+        self._inflight = {}  # chat_id -> asyncio.Task
+
+    async def get(self, bot: Bot, chat_id: int) -> dict[int, str]:
+        entry = self._rosters.get(chat_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+        task = self._inflight.get(chat_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(bot, chat_id))
+            self._inflight[chat_id] = task
+            task.add_done_callback(lambda t: self._inflight.pop(chat_id, None) if self._inflight.get(chat_id) is t else None)
+
+        # Shielded so one cancelled waiter does not cancel the request for everybody else
+        return await asyncio.shield(task)
+
+    async def get_status(self, bot: Bot, chat_id: int, user_id: int) -> str | None:
+        """Returns 'creator' / 'administrator' for chat admins, None for everyone else."""
+        roster = await self.get(bot, chat_id)
+        return roster.get(user_id)
+
+    async def _fetch(self, bot: Bot, chat_id: int) -> dict[int, str]:
+        try:
+            admins = await bot.get_chat_administrators(chat_id)
+        except Exception as e:
+            # Serve the expired list rather than failing every message while Telegram is unhappy
+            entry = self._rosters.get(chat_id)
+            if entry is None:
+                raise
+            logging.warning(f"Failed to refresh admins of {chat_id}, using cached list: {e}")
+            return entry[1]
+
+        roster = {admin.user.id: admin.status for admin in admins}
+        self._rosters[chat_id] = (time.monotonic() + self.ttl, roster)
+        return roster
+
+    def update_member(self, chat_id: int, user_id: int, status: str):
+        """Applies a chat_member / my_chat_member status change to the cached roster."""
+        entry = self._rosters.get(chat_id)
+        if entry is None:
+            return # Nothing cached yet, the next lookup fetches a fresh list
+
+        roster = entry[1]
+        if status in ADMIN_STATUSES:
+            roster[user_id] = status
+        else:
+            roster.pop(user_id, None)
+
+    def forget(self, chat_id: int):
+        self._rosters.pop(chat_id, None)
+
+
+admin_roster = AdminRoster()
@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    BanChatMember, DeleteMessage, DeleteMessages, GetUpdates, RestrictChatMember,
+    SetChatPermissions, UnbanChatMember,
+)
+from aiogram.types import Message
+
+from utils.metrics import metrics, api_seconds, api_errors_total
+
+# Telegram's documented limits: ~30 messages/s overall, 20/min in a group, ~1/s in a private chat
+GLOBAL_RATE = 30
+GROUP_RATE = 20 / 60
+PRIVATE_RATE = 1
+GROUP_BURST = 5
+# Informational messages waiting on one chat beyond this are dropped instead of queued
+MAX_CHAT_BACKLOG = 20
+API_RETRIES = 3
+# Idle per-chat buckets are forgotten once there are more than this
+MAX_CHAT_BUCKETS = 10000
+
+# Lower runs first: moderation must not wait behind replies and welcome messages
+PRIORITY_MODERATION = 0
+PRIORITY_DEFAULT = 1
+MODERATION_METHODS = (
+    BanChatMember, UnbanChatMember, RestrictChatMember, SetChatPermissions, DeleteMessage, DeleteMessages,
+)
+
+class OutboundBacklogFull(Exception):
+    """
+    A message was dropped before reaching Telegram because its chat's queue is full.
+    Not a TelegramRetryAfter on purpose: waiting and resending would only feed the backlog.
+    """
+
+    def __init__(self, chat_id: int, backlog: float):
+        super().__init__(f"Outbound backlog of chat {chat_id} is full ({backlog:.0f}s)")
+        self.chat_id = chat_id
+        self.backlog = backlog
+
+class TokenBucket:
+    """
+    Refills `rate` tokens per second up to `capacity`. Callers that find it empty
+    wait in a priority heap and are woken by a single timer as tokens come back.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._waiters = []  # (priority, seq, future)
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return not self._waiters and self.tokens >= self.capacity
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT):
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._timer is None:
+            self._reschedule()
+        # A cancelled caller leaves a done future behind, _wake skips it
+        await future
+
+    def pause(self, seconds: float):
+        """Flood control answered retry_after: no tokens for that long."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+        self._reschedule()
+
+    def _wake(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._waiters and self._timer is None:
+            self._reschedule()
+
+    def _reschedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters:
+            delay = (1 - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0), self._wake)
+
+class ApiExecutor(BaseRequestMiddleware):
+    """
+    Session middleware every Bot API call goes through (see main.create_bot).
+    All calls share the global bucket; messages also take a token from their chat's bucket.
+    Moderation calls (ban, restrict, delete) jump the queue and skip the per-chat limit,
+    so a raid delays the bot's replies rather than its actions.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.shed = 0  # informational messages dropped under backlog
+
+    def scale(self, share: float):
+        """Gives this process `share` of the global rate (sharded workers split it)."""
+        self.global_bucket.rate = self.global_bucket.capacity = GLOBAL_RATE * share
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self.chat_buckets = {key: b for key, b in self.chat_buckets.items() if not b.idle}
+            if chat_id < 0:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+            else:
+                bucket = TokenBucket(PRIVATE_RATE, PRIVATE_RATE)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    @property
+    def depth(self) -> dict:
+        """Calls waiting for a token right now."""
+        return {
+            "global": self.global_bucket.depth,
+            "chats": sum(bucket.depth for bucket in self.chat_buckets.values()),
+        }
+
+    async def __call__(self, make_request, bot, method):
+        # Long polling is not an API action and must never wait
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        method_name = type(method).__name__
+        priority = PRIORITY_MODERATION if isinstance(method, MODERATION_METHODS) else PRIORITY_DEFAULT
+        chat_id = getattr(method, "chat_id", None)
+        bucket = None
+        if priority != PRIORITY_MODERATION and isinstance(chat_id, int) and method_name.startswith(("Send", "Copy", "Forward")):
+            bucket = self.chat_bucket(chat_id)
+
+        for attempt in range(API_RETRIES):
+            if bucket is not None:
+                if bucket.depth >= MAX_CHAT_BACKLOG:
+                    self.shed += 1
+                    raise OutboundBacklogFull(chat_id, bucket.depth / bucket.rate)
+                await bucket.acquire(priority)
+            await self.global_bucket.acquire(priority)
+
+            start = time.perf_counter()
+            try:
+                return await make_request(bot, method)
+            except Exception as e:
+                api_errors_total.inc(method_name, type(e).__name__)
+                if not isinstance(e, TelegramRetryAfter):
+                    raise
+                flood = e
+            finally:
+                # Time on the wire only, waiting for a token is not included
+                api_seconds.observe(time.perf_counter() - start, method_name)
+
+            logging.warning(f"Flood control on {method_name} (chat {chat_id}): retry after {flood.retry_after}s")
+            if attempt == API_RETRIES - 1:
+                raise flood
+            if bucket is not None:
+                # Everyone behind us in this chat waits it out too
+                bucket.pause(flood.retry_after)
+            else:
+                await asyncio.sleep(flood.retry_after)
+
+api_executor = ApiExecutor()
+
+metrics.collected(
+    "bot_api_queue_depth", "Bot API calls waiting for a rate limit token",
+    lambda: {(bucket,): depth for bucket, depth in api_executor.depth.items()}, ("bucket",)
+)
+metrics.collected(
+    "bot_api_shed_total", "Informational messages dropped because their chat's queue was full",
+    lambda: {(): api_executor.shed}, kind="counter"
+)
+
+async def notify(message: Message, text: str, reply: bool = False, **kwargs) -> Message | None:
+    """
+    Informational message (a reply if `reply`): dropped instead of raised when the chat is flooded.
+    Extra keyword arguments (reply_markup, ...) go to message.answer / message.reply.
+    """
+    try:
+        if reply:
+            return await message.reply(text, **kwargs)
+        return await message.answer(text, **kwargs)
+    except OutboundBacklogFull as e:
+        logging.info(f"Notice in chat {message.chat.id} dropped: {e}")
+    except TelegramRetryAfter as e:
+        logging.info(f"Notice in chat {message.chat.id} dropped: still rate limited after {API_RETRIES} tries ({e.retry_after}s)")
+    return None
@@ -0,0 +1,26 @@
+import asyncio
+
+# Bot API calls in flight at once for one bulk command
+BULK_CONCURRENCY = 5
+
+async def run_bulk(call, targets: list, concurrency: int = BULK_CONCURRENCY) -> tuple[list, dict]:
+    """
+    Runs `await call(target)` for every target with at most `concurrency` calls in flight.
+    Flood control is waited out (and retried) by the API executor, so an error here is final.
+    Returns (succeeded targets, {target: error text}).
+    """
+    pending = list(reversed(targets))
+    done = []
+    failed = {}
+
+    async def worker():
+        while pending:
+            target = pending.pop()
+            try:
+                await call(target)
+                done.append(target)
+            except Exception as e:
+                failed[target] = str(e)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(targets)))))
+    return done, failed
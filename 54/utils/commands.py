@@ -0,0 +1,54 @@
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import Message
+
+COMMAND_PREFIX = "!"
+
+def parse_command(text: str | None) -> str | None:
+    """Returns the leading '!command' token of a message, or None for plain text."""
+    if not text or not text.startswith(COMMAND_PREFIX):
+        return None
+    return text.split(maxsplit=1)[0]
+
+class CommandTable:
+    """
+    Dispatches '!command' messages through a dict instead of one filter per handler.
+    The command token is parsed once, plain messages are rejected by a single prefix check.
+
+        @commands.command("!kick")
+        async def kick_handler(message: Message, user_role: str, lang_code: str): ...
+
+    Handlers receive the same injected arguments (user_role, lang_code, state, ...)
+    as regular aiogram handlers.
+    """
+
+    def __init__(self, name: str = "commands"):
+        self._handlers: dict[str, CallableObject] = {}
+        self.router = Router(name=name)
+        self.router.message.register(self._dispatch, self._match)
+
+    def command(self, *names: str):
+        def decorator(callback):
+            handler = CallableObject(callback)
+            for name in names:
+                if name in self._handlers:
+                    raise ValueError(f"Command {name} is already registered")
+                self._handlers[name] = handler
+            return callback
+        return decorator
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._handlers
+
+    def _match(self, message: Message):
+        command = parse_command(message.text)
+        if command is None or command not in self._handlers:
+            return False
+        return {"command_name": command}
+
+    async def _dispatch(self, message: Message, command_name: str, **data):
+        # command_name only reaches handlers that declare it (shared handlers like !mban/!mkick)
+        return await self._handlers[command_name].call(message, command_name=command_name, **data)
+
+
+commands = CommandTable()
@@ -0,0 +1,81 @@
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import ChatPermissions
+
+from database.manager import get_db
+from database.chat_settings import invalidate_chat_settings
+from utils.logger import log_action
+from utils.scheduler import scheduler, ScheduledAction
+
+# Restored on unlock when the chat's own permissions were not saved
+UNLOCKED_PERMISSIONS = ChatPermissions(
+    can_send_messages=True,
+    can_send_audios=True,
+    can_send_documents=True,
+    can_send_photos=True,
+    can_send_videos=True,
+    can_send_video_notes=True,
+    can_send_voice_notes=True,
+    can_send_polls=True,
+    can_send_other_messages=True,
+    can_add_web_page_previews=True,
+    can_invite_users=True
+)
+
+async def _set_lockdown_flag(chat_id: int, enabled: bool):
+    async with get_db() as db:
+        if enabled:
+            await db.execute("UPDATE chats SET lockdown_enabled = 1 WHERE chat_id = ?", (chat_id,))
+        else:
+            await db.execute("UPDATE chats SET lockdown_enabled = 0, saved_permissions = NULL WHERE chat_id = ?", (chat_id,))
+        await db.commit()
+    invalidate_chat_settings(chat_id)
+
+async def _save_permissions(bot: Bot, chat_id: int):
+    """Remembers the chat's permissions, unless it is already locked (they would be the locked ones)."""
+    try:
+        permissions = (await bot.get_chat(chat_id)).permissions
+    except TelegramAPIError as e:
+        logging.warning(f"Could not read permissions of {chat_id} before lockdown: {e}")
+        return
+    if permissions is None:
+        return
+    async with get_db() as db:
+        await db.execute(
+            "UPDATE chats SET saved_permissions = ? WHERE chat_id = ? AND lockdown_enabled = 0",
+            (permissions.model_dump_json(exclude_none=True), chat_id)
+        )
+        await db.commit()
+
+async def _saved_permissions(chat_id: int) -> ChatPermissions:
+    async with get_db(readonly=True) as db:
+        async with db.execute("SELECT saved_permissions FROM chats WHERE chat_id = ?", (chat_id,)) as cursor:
+            row = await cursor.fetchone()
+    if row and row[0]:
+        return ChatPermissions.model_validate_json(row[0])
+    return UNLOCKED_PERMISSIONS
+
+async def apply_lockdown(bot: Bot, chat_id: int, until=None):
+    """Makes the chat read-only for regular members, until `until` if given."""
+    await _save_permissions(bot, chat_id)
+    # permissions=ChatPermissions(can_send_messages=False) makes it read-only for default role
+    await bot.set_chat_permissions(chat_id, ChatPermissions(can_send_messages=False))
+    await _set_lockdown_flag(chat_id, True)
+
+    if until:
+        await scheduler.schedule("unlock", chat_id, 0, until)
+    else:
+        await scheduler.cancel("unlock", chat_id, 0)
+
+async def lift_lockdown(bot: Bot, chat_id: int):
+    """Puts back the permissions the chat had before the lockdown."""
+    await bot.set_chat_permissions(chat_id, await _saved_permissions(chat_id))
+    await _set_lockdown_flag(chat_id, False)
+    await scheduler.cancel("unlock", chat_id, 0)
+
+@scheduler.job("unlock")
+async def lockdown_expired(bot: Bot, action: ScheduledAction):
+    await lift_lockdown(bot, action.chat_id)
+    await log_action(bot, action.chat_id, "Unlock", "Lockdown time is over")
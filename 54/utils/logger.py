@@ -1,25 +1,116 @@
-from database.manager import get_db
+import asyncio
+import time
+from collections import deque
+
 from aiogram import Bot
+from database.chat_settings import get_chat_settings
+from utils.metrics import metrics
 
-async def log_action(bot: Bot, chat_id: int, action: str, details: str):
+# Telegram allows roughly 20 messages per minute into one group/channel
+LOG_MIN_INTERVAL = 3  # seconds between two messages to the same log channel
+# Pending entries kept per channel; during a raid the oldest ones are dropped
+LOG_MAX_PENDING = 100
+# Telegram's message limit is 4096 characters, leave room for the header
+LOG_MAX_MESSAGE_LEN = 3800
+
+def format_entry(action: str, details: str) -> str:
+    return f"📌 <b>Action:</b> {action}\n" \
+           f"ℹ️ <b>Details:</b> {details}"
+
+class LogDispatcher:
     """
-    Logs an action to the configured log channel for the chat.
+    Delivers log reports in the background so handlers never wait on Telegram.
+    Entries for the same log channel are queued, merged into one message per
+    send and spaced by LOG_MIN_INTERVAL; flood control is waited out by the
+    API executor (utils/api_executor.py).
     """
-    log_channel_id = None
-    
-    async with get_db() as db:
-        async with db.execute("SELECT log_channel_id FROM chats WHERE chat_id = ?", (chat_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                log_channel_id = row[0]
-                
-    if log_channel_id:
+
+    def __init__(self):
+        self._pending = {}  # log_channel_id -> deque of formatted entries
+        self._dropped = {}  # log_channel_id -> entries lost to the LOG_MAX_PENDING bound
+        self._next_send = {}  # log_channel_id -> monotonic time of the next allowed send
+        self._workers = {}  # log_channel_id -> asyncio.Task
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._pending.values())
+
+    def submit(self, bot: Bot, log_channel_id: int, text: str):
+        queue = self._pending.get(log_channel_id)
+        if queue is None:
+            queue = self._pending[log_channel_id] = deque()
+        if len(queue) >= LOG_MAX_PENDING:
+            queue.popleft()
+            self._dropped[log_channel_id] = self._dropped.get(log_channel_id, 0) + 1
+        queue.append(text)
+
+        if log_channel_id not in self._workers:
+            self._workers[log_channel_id] = asyncio.create_task(self._drain(bot, log_channel_id))
+
+    def _take_batch(self, log_channel_id: int) -> str:
+        queue = self._pending[log_channel_id]
+        entries = [queue.popleft()]
+        length = len(entries[0])
+        while queue and length + len(queue[0]) + 2 <= LOG_MAX_MESSAGE_LEN:
+            entry = queue.popleft()
+            entries.append(entry)
+            length += len(entry) + 2
+
+        header = "📝 <b>LOG REPORT</b>"
+        if len(entries) > 1:
+            header += f" ({len(entries)})"
+        text = header + "\n\n" + "\n\n".join(entries)
+
+        dropped = self._dropped.pop(log_channel_id, 0)
+        if dropped:
+            text += f"\n\n⚠️ {dropped} older entries skipped"
+        return text
+
+    async def _send(self, bot: Bot, log_channel_id: int, text: str):
         try:
-            # Format the log message
-            text = f"📝 <b>LOG REPORT</b>\n\n" \
-                   f"📌 <b>Action:</b> {action}\n" \
-                   f"ℹ️ <b>Details:</b> {details}"
-            
             await bot.send_message(log_channel_id, text)
         except Exception as e:
             print(f"Failed to send log to {log_channel_id}: {e}")
+
+    async def _drain(self, bot: Bot, log_channel_id: int):
+        try:
+            while self._pending.get(log_channel_id):
+                delay = self._next_send.get(log_channel_id, 0) - time.monotonic()
+                if delay > 0:
+                    # Entries arriving meanwhile are merged into the same message
+                    await asyncio.sleep(delay)
+
+                await self._send(bot, log_channel_id, self._take_batch(log_channel_id))
+                self._next_send[log_channel_id] = time.monotonic() + LOG_MIN_INTERVAL
+        finally:
+            del self._workers[log_channel_id]
+            if not self._pending.get(log_channel_id):
+                self._pending.pop(log_channel_id, None)
+
+    async def close(self, timeout: float = 10):
+        """Waits (up to timeout) for queued reports to go out, then gives up on the rest."""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+log_dispatcher = LogDispatcher()
+
+metrics.collected(
+    "bot_log_queue_depth", "Log channel entries waiting to be sent",
+    lambda: {(): log_dispatcher.queue_depth}
+)
+
+async def log_action(bot: Bot, chat_id: int, action: str, details: str):
+    """
+    Logs an action to the configured log channel for the chat.
+    Returns immediately, the report is sent in the background by log_dispatcher.
+    """
+    log_channel_id = (await get_chat_settings(chat_id)).log_channel_id
+
+    if log_channel_id:
+        log_dispatcher.submit(bot, log_channel_id, format_entry(action, details))
@@ -0,0 +1,151 @@
+import logging
+from bisect import bisect_left
+
+from aiohttp import web
+
+# Latency buckets in seconds, from a cached lookup up to a stuck Bot API call
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}  # label values tuple -> float
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in self._values.items()]
+
+class Histogram:
+    """Fixed buckets; observe() is one bisect and three additions, cumulative counts are built at scrape time."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values tuple -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Collected:
+    """A gauge or counter read from elsewhere when scraped; collect() returns {label values: value}."""
+
+    def __init__(self, name: str, help: str, collect, labelnames: tuple = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in self.collect().items()]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name: str, help: str, collect, labelnames: tuple = (), kind: str = "gauge") -> Collected:
+        return self._register(Collected(name, help, collect, labelnames, kind))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.render()
+            except Exception as e:
+                logging.warning(f"Metric {metric.name} failed to render: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Shared by the middlewares, the database pool and the Bot API executor
+updates_total = metrics.counter("bot_updates_total", "Updates received, by type", ("type", "handled"))
+update_seconds = metrics.histogram("bot_update_seconds", "Time to process one update, by type", ("type",))
+middleware_seconds = metrics.histogram(
+    "bot_middleware_seconds", "Time spent inside a middleware, not counting what it calls", ("middleware",)
+)
+handler_seconds = metrics.histogram("bot_handler_seconds", "Handler latency, by command or handler name", ("handler",))
+db_query_seconds = metrics.histogram("bot_db_query_seconds", "SQL statement execution time", ("statement",))
+api_seconds = metrics.histogram("bot_api_seconds", "Bot API call latency", ("method",))
+api_errors_total = metrics.counter("bot_api_errors_total", "Failed Bot API calls", ("method", "error"))
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner | None:
+    """
+    Serves GET /metrics; stop it with `await runner.cleanup()`.
+    A busy port is logged and skipped, the bot runs fine without metrics.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host=host, port=port).start()
+    except OSError as e:
+        logging.error(f"Metrics server could not listen on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return runner
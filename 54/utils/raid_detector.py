@@ -0,0 +1,126 @@
+import logging
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+
+import config
+from database.chat_settings import get_chat_settings
+from utils.i18n import i18n
+from utils.lockdown import apply_lockdown
+from utils.logger import log_action
+
+# Chats without any activity for this long drop their counters
+IDLE_CHAT_TTL = 600  # seconds
+# Idle chats are looked for once every this many recorded events
+SWEEP_EVERY = 10000
+
+class SlidingCounter:
+    """Events in the last `window` seconds, kept as a ring of per-second buckets."""
+
+    __slots__ = ("window", "buckets", "second", "total")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buckets = array("I", bytes(4 * window))
+        self.second = 0
+        self.total = 0
+
+    def _advance(self, second: int):
+        gap = second - self.second
+        if gap <= 0:
+            return
+        if gap >= self.window:
+            self.buckets = array("I", bytes(4 * self.window))
+            self.total = 0
+        else:
+            for s in range(self.second + 1, second + 1):
+                i = s % self.window
+                self.total -= self.buckets[i]
+                self.buckets[i] = 0
+        self.second = second
+
+    def add(self, now: float) -> int:
+        second = int(now)
+        self._advance(second)
+        self.buckets[second % self.window] += 1
+        self.total += 1
+        return self.total
+
+    def count(self, now: float) -> int:
+        self._advance(int(now))
+        return self.total
+
+class RaidDetector:
+    """
+    Per-chat join / message / link rates over the last RAID_WINDOW seconds.
+    record() returns the reason once a rate reaches its limit, then stays
+    quiet for that chat until the raid lockdown would have expired.
+    """
+
+    def __init__(self, window: int, limits: dict):
+        self.window = window
+        self.limits = {kind: limit for kind, limit in limits.items() if limit > 0}
+        self._chats = {}  # chat_id -> (last event time, {kind: SlidingCounter})
+        self._quiet_until = {}  # chat_id -> time before which no new raid is reported
+        self._events = 0
+
+    def record(self, kind: str, chat_id: int) -> str | None:
+        limit = self.limits.get(kind)
+        if limit is None:
+            return None
+
+        now = time.time()
+        entry = self._chats.get(chat_id)
+        if entry is None:
+            entry = self._chats[chat_id] = [now, {}]
+        entry[0] = now
+        counter = entry[1].get(kind)
+        if counter is None:
+            counter = entry[1][kind] = SlidingCounter(self.window)
+        count = counter.add(now)
+
+        self._events += 1
+        if self._events >= SWEEP_EVERY:
+            self._sweep(now)
+
+        if count < limit or self._quiet_until.get(chat_id, 0) > now:
+            return None
+        self._quiet_until[chat_id] = now + max(config.RAID_LOCK_DURATION, self.window)
+        return f"{count} {kind}s in {self.window}s"
+
+    def _sweep(self, now: float):
+        self._events = 0
+        for chat_id in [c for c, (last, _) in self._chats.items() if now - last > IDLE_CHAT_TTL]:
+            del self._chats[chat_id]
+        for chat_id in [c for c, until in self._quiet_until.items() if until <= now]:
+            del self._quiet_until[chat_id]
+
+
+raid_detector = RaidDetector(config.RAID_WINDOW, {
+    "join": config.RAID_JOIN_LIMIT,
+    "message": config.RAID_MESSAGE_LIMIT,
+    "link": config.RAID_LINK_LIMIT,
+})
+
+async def raid_lockdown(bot: Bot, chat_id: int, reason: str):
+    """Locks the chat through the regular lockdown path, unless it is already locked."""
+    chat_settings = await get_chat_settings(chat_id)
+    if chat_settings.lockdown_enabled:
+        return
+
+    duration = timedelta(seconds=config.RAID_LOCK_DURATION) if config.RAID_LOCK_DURATION else None
+    try:
+        await apply_lockdown(bot, chat_id, datetime.now() + duration if duration else None)
+    except Exception as e:
+        logging.error(f"Raid lockdown failed in {chat_id}: {e}")
+        await log_action(bot, chat_id, "Raid", f"Raid detected ({reason}), lockdown failed: {e}")
+        return
+
+    await log_action(bot, chat_id, "Raid", f"Raid detected ({reason}). Lockdown enabled for {duration or 'until !unlock'}")
+    try:
+        time_text = str(duration) if duration else "!unlock"
+        await bot.send_message(chat_id, i18n.get(chat_settings.language, "raid_lockdown", reason=reason, time=time_text))
+    except Exception as e:
+        logging.error(f"Raid notice failed in {chat_id}: {e}")
@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from aiogram import Bot
+
+from database.manager import get_db
+from utils.metrics import metrics
+
+# Due actions handled per wakeup; the rest follow on the next loop turn
+FIRE_BATCH_SIZE = 500
+
+@dataclass
+class ScheduledAction:
+    id: int
+    kind: str
+    chat_id: int
+    target_id: int
+    due: float  # unix time
+    data: dict = field(default_factory=dict)
+
+    @property
+    def key(self) -> tuple:
+        return (self.kind, self.chat_id, self.target_id)
+
+class Scheduler:
+    """
+    Durable delayed actions (punishment expiry, lockdown lift, ...).
+    Actions live in the scheduled_actions table and in one in-memory heap
+    served by a single task, so a pending action costs a heap entry, not a coroutine.
+
+        @scheduler.job("unmute")
+        async def on_unmute(bot: Bot, action: ScheduledAction): ...
+
+        await scheduler.schedule("unmute", chat_id, user_id, until_date)
+
+    An action is unique per (kind, chat_id, target_id): scheduling again moves it,
+    cancel() drops it.
+    """
+
+    def __init__(self):
+        self._jobs = {}  # kind -> handler
+        self._heap = []  # (due, id, ScheduledAction), may hold replaced entries
+        self._current = {}  # key -> id of the live action
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self._bot = None
+        # (index, count) when running as a sharded worker: only own chats are loaded
+        self.shard = None
+
+    def job(self, kind: str):
+        def decorator(callback):
+            if kind in self._jobs:
+                raise ValueError(f"Job {kind} is already registered")
+            self._jobs[kind] = callback
+            return callback
+        return decorator
+
+    @property
+    def pending(self) -> int:
+        return len(self._current)
+
+    def _owns(self, chat_id: int) -> bool:
+        return self.shard is None or chat_id % self.shard[1] == self.shard[0]
+
+    def _push(self, action: ScheduledAction):
+        if not self._owns(action.chat_id):
+            # Stored for the worker that owns the chat
+            return
+        self._current[action.key] = action.id
+        heapq.heappush(self._heap, (action.due, action.id, action))
+        # Replaced entries are skipped when popped; rebuild if they pile up
+        if len(self._heap) > 2 * len(self._current) + 1000:
+            self._heap = [entry for entry in self._heap if self._current.get(entry[2].key) == entry[1]]
+            heapq.heapify(self._heap)
+        if self._heap[0][1] == action.id:
+            self._wakeup.set()
+
+    async def schedule(self, kind: str, chat_id: int, target_id: int, due: datetime | float, data: dict | None = None):
+        await self.schedule_many(kind, chat_id, [(target_id, data)], due)
+
+    async def schedule_many(self, kind: str, chat_id: int, targets: list, due: datetime | float):
+        """Schedules the same action for many (target_id, data) pairs in one transaction."""
+        if isinstance(due, datetime):
+            due = due.timestamp()
+
+        actions = []
+        async with get_db() as db:
+            for target_id, data in targets:
+                data = data or {}
+                cursor = await db.execute(
+                    "INSERT OR REPLACE INTO scheduled_actions (kind, chat_id, target_id, due, data) VALUES (?, ?, ?, ?, ?)",
+                    (kind, chat_id, target_id, due, json.dumps(data))
+                )
+                actions.append(ScheduledAction(cursor.lastrowid, kind, chat_id, target_id, due, data))
+                await cursor.close()
+            await db.commit()
+
+        for action in actions:
+            self._push(action)
+
+    async def cancel(self, kind: str, chat_id: int, target_id: int):
+        if self._current.pop((kind, chat_id, target_id), None) is None:
+            return
+        async with get_db() as db:
+            await db.execute(
+                "DELETE FROM scheduled_actions WHERE kind = ? AND chat_id = ? AND target_id = ?",
+                (kind, chat_id, target_id)
+            )
+            await db.commit()
+
+    async def cancel_many(self, kind: str, chat_id: int, target_ids: list):
+        """Drops the pending actions of many targets in one transaction."""
+        live = [target_id for target_id in target_ids if self._current.pop((kind, chat_id, target_id), None) is not None]
+        if not live:
+            return
+        async with get_db() as db:
+            await db.executemany(
+                "DELETE FROM scheduled_actions WHERE kind = ? AND chat_id = ? AND target_id = ?",
+                [(kind, chat_id, target_id) for target_id in live]
+            )
+            await db.commit()
+
+    async def _load(self):
+        async with get_db(readonly=True) as db:
+            async with db.execute("SELECT id, kind, chat_id, target_id, due, data FROM scheduled_actions") as cursor:
+                rows = await cursor.fetchall()
+
+        self._heap = []
+        self._current = {}
+        for action_id, kind, chat_id, target_id, due, data in rows:
+            if self._owns(chat_id):
+                action = ScheduledAction(action_id, kind, chat_id, target_id, due, json.loads(data))
+                self._current[action.key] = action.id
+                self._heap.append((due, action_id, action))
+        heapq.heapify(self._heap)
+        logging.info(f"Scheduler loaded {len(self._heap)} pending actions")
+
+    def _pop_due(self, now: float) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < FIRE_BATCH_SIZE:
+            _, action_id, action = heapq.heappop(self._heap)
+            if self._current.get(action.key) == action_id:
+                del self._current[action.key]
+                due.append(action)
+        return due
+
+    async def _fire(self, action: ScheduledAction):
+        handler = self._jobs.get(action.kind)
+        if handler is None:
+            logging.error(f"No handler for scheduled action {action.kind}")
+            return
+        try:
+            await handler(self._bot, action)
+        except Exception as e:
+            logging.error(f"Scheduled action {action.kind} in {action.chat_id} failed: {e}")
+
+    async def _run(self):
+        while not self._closing:
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            batch = self._pop_due(time.time())
+            if not batch:
+                continue
+            await asyncio.gather(*(self._fire(action) for action in batch))
+            try:
+                async with get_db() as db:
+                    await db.executemany("DELETE FROM scheduled_actions WHERE id = ?", [(a.id,) for a in batch])
+                    await db.commit()
+            except Exception as e:
+                # Rows left behind are fired again after a restart
+                logging.error(f"Failed to clear fired actions: {e}")
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        if self._task is None:
+            await self._load()
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+
+scheduler = Scheduler()
+
+metrics.collected(
+    "bot_scheduled_actions", "Delayed actions waiting to fire in this process",
+    lambda: {(): scheduler.pending}
+)
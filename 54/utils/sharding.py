@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from aiogram import Bot
+
+import config
+from database.manager import init_db, pool
+from database.stats_buffer import stats_buffer
+from utils.api_executor import api_executor
+from utils.logger import log_dispatcher
+from utils.metrics import start_metrics_server
+from utils.scheduler import scheduler
+from utils.warn_engine import start_warn_compaction
+
+# get_updates long-poll timeout used by the front process
+POLL_TIMEOUT = 30  # seconds
+
+def get_update_chat_id(update: dict) -> int | None:
+    """Finds the chat an update belongs to in raw update JSON."""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+    return None
+
+def shard_for(chat_id: int | None, workers: int) -> int:
+    # Python's % is never negative, so group ids (-100...) spread evenly too
+    return (chat_id or 0) % workers
+
+class ChatOrderedFeeder:
+    """
+    Feeds updates into a Dispatcher concurrently across chats,
+    but strictly one after another within the same chat.
+    """
+
+    def __init__(self, dp, bot: Bot):
+        self.dp = dp
+        self.bot = bot
+        self._tails = {}  # chat_id -> task of the last update submitted for that chat
+
+    def submit(self, chat_id: int | None, update: dict):
+        previous = self._tails.get(chat_id)
+        task = asyncio.create_task(self._feed(previous, update))
+        self._tails[chat_id] = task
+        task.add_done_callback(lambda t: self._tails.pop(chat_id, None) if self._tails.get(chat_id) is t else None)
+
+    async def _feed(self, previous, update: dict):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception:
+            logging.exception(f"Failed to process update {update.get('update_id')}")
+
+    async def drain(self):
+        while self._tails:
+            await asyncio.gather(*self._tails.values(), return_exceptions=True)
+
+async def _worker_main(index: int, workers: int, queue):
+    from main import create_bot, create_dispatcher
+
+    await pool.open()
+    stats_buffer.start()
+    bot = create_bot()
+    dp = create_dispatcher()
+    feeder = ChatOrderedFeeder(dp, bot)
+    # Workers share one bot token, so they split Telegram's global rate limit
+    api_executor.scale(1 / workers)
+    # Delayed actions of a chat fire on the worker that owns the chat
+    scheduler.shard = (index, workers)
+    await scheduler.start(bot)
+    if index == shard_for(0, workers):
+        # One compaction row (chat 0) for the whole database, run by the worker that owns it
+        await start_warn_compaction()
+    metrics_runner = None
+    if config.METRICS_PORT:
+        metrics_runner = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT + index)
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+
+    def terminate():
+        main_task.cancel()
+        # Wakes the executor thread blocked in queue.get, or the loop could not shut down
+        queue.put(None)
+
+    loop.add_signal_handler(signal.SIGTERM, terminate)
+    logging.info(f"Worker {index} started")
+
+    try:
+        while True:
+            item = await loop.run_in_executor(None, queue.get)
+            if item is None:
+                break
+            chat_id, update = item
+            feeder.submit(chat_id, update)
+        await feeder.drain()
+    except asyncio.CancelledError:
+        # SIGTERM: stop right away, but still flush stats and close the pool below
+        logging.info(f"Worker {index} terminated")
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await scheduler.stop()
+        await log_dispatcher.close()
+        await dp.storage.close()
+        await bot.session.close()
+        await stats_buffer.stop()
+        await pool.close()
+        logging.info(f"Worker {index} stopped")
+
+def worker_process(index: int, workers: int, queue):
+    # Ctrl+C reaches the whole process group; the front process decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - worker {index} - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(_worker_main(index, workers, queue))
+
+async def _poll_front(queues):
+    from main import create_bot, create_dispatcher, get_allowed_updates
+
+    bot = create_bot()
+    allowed_updates = get_allowed_updates(create_dispatcher())
+    offset = None
+    backoff = 1
+
+    try:
+        await bot.delete_webhook()
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates)
+                backoff = 1
+            except Exception as e:
+                logging.error(f"Failed to fetch updates: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                raw = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+                chat_id = get_update_chat_id(raw)
+                queues[shard_for(chat_id, len(queues))].put((chat_id, raw))
+    finally:
+        await bot.session.close()
+
+def run_sharded(workers: int):
+    """
+    Front process polls Telegram and routes every update by chat id to one of
+    `workers` processes, each running its own Dispatcher, caches and DB pool.
+    All updates of a chat land on the same worker and are handled in order.
+    """
+    asyncio.run(init_db())
+
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(workers)]
+    processes = [ctx.Process(target=worker_process, args=(i, workers, queues[i]), name=f"worker-{i}") for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        asyncio.run(_poll_front(queues))
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join()
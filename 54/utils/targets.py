@@ -0,0 +1,131 @@
+from collections import OrderedDict
+
+from aiogram.types import Message, User
+
+from database.manager import get_db
+
+# SQLite allows 999 host parameters per statement in older builds
+MAX_LOOKUP = 900
+# (chat_id, username) pairs remembered in memory
+RESOLVER_CACHE_SIZE = 20000
+# Shorter all-digit arguments are counts or levels, not Telegram user ids
+MIN_USER_ID_DIGITS = 5
+
+class TargetResolver:
+    """
+    Maps @usernames to user ids per chat.
+    Lookups go through an LRU cache that StatsMiddleware keeps current from
+    every message, so most commands resolve their target without touching the DB.
+    A member seen with a new username (or none) loses the old entry, so a freed
+    @name never resolves to its previous owner.
+    """
+
+    def __init__(self, size: int = RESOLVER_CACHE_SIZE):
+        self.size = size
+        self._cache = OrderedDict()  # (chat_id, username) -> user_id
+        self._names = {}  # (chat_id, user_id) -> username; mirrors _cache entry for entry
+
+    def remember(self, chat_id: int, username: str | None, user_id: int):
+        previous = self._names.get((chat_id, user_id))
+        if previous is not None and previous != username:
+            # Renamed or dropped the @name: the old one no longer points to them
+            del self._cache[(chat_id, previous)]
+            del self._names[(chat_id, user_id)]
+        if username is None:
+            return
+
+        key = (chat_id, username)
+        owner = self._cache.get(key)
+        if owner != user_id:
+            if owner is not None:
+                del self._names[(chat_id, owner)]
+            self._cache[key] = user_id
+            self._names[(chat_id, user_id)] = username
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.size:
+            (old_chat_id, _), old_user_id = self._cache.popitem(last=False)
+            del self._names[(old_chat_id, old_user_id)]
+
+    async def resolve_many(self, chat_id: int, usernames: list[str]) -> dict[str, int]:
+        """Returns {username: user_id} for the known ones; cache misses are loaded in one query."""
+        usernames = list(dict.fromkeys(name.lower().lstrip("@") for name in usernames))[:MAX_LOOKUP]
+        found = {}
+        missing = []
+        for username in usernames:
+            user_id = self._cache.get((chat_id, username))
+            if user_id is None:
+                missing.append(username)
+            else:
+                self._cache.move_to_end((chat_id, username))
+                found[username] = user_id
+
+        if missing:
+            placeholders = ", ".join("?" * len(missing))
+            async with get_db(readonly=True) as db:
+                async with db.execute(
+                    f"SELECT username, user_id FROM users WHERE chat_id = ? AND username IN ({placeholders})",
+                    (chat_id, *missing)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+            for username, user_id in rows:
+                self.remember(chat_id, username, user_id)
+                found[username] = user_id
+
+        return found
+
+    async def resolve(self, chat_id: int, username: str) -> int | None:
+        username = username.lower().lstrip("@")
+        return (await self.resolve_many(chat_id, [username])).get(username)
+
+
+target_resolver = TargetResolver()
+
+async def resolve_target(message: Message, args: list[str] | None = None) -> User | None:
+    """
+    Finds the user a moderation command is aimed at:
+    replied-to message, then a text mention, then the first @username or numeric id in args
+    (defaults to the words after the command).
+    """
+    if message.reply_to_message and message.reply_to_message.from_user:
+        return message.reply_to_message.from_user
+
+    for entity in message.entities or []:
+        if entity.type == "text_mention" and entity.user:
+            return entity.user
+
+    if args is None:
+        args = message.text.split()[1:]
+    for word in args:
+        if word.startswith("@") and len(word) > 1:
+            username = word[1:].lower()
+            user_id = await target_resolver.resolve(message.chat.id, username)
+            # aiogram methods only need the id; the username stands in for the name
+            return User(id=user_id, is_bot=False, first_name=username) if user_id else None
+        if word.isdigit() and len(word) >= MIN_USER_ID_DIGITS:
+            return User(id=int(word), is_bot=False, first_name=word)
+    return None
+
+async def get_roles(chat_id: int, user_ids: list[int]) -> dict[int, str]:
+    """Bot-level roles of many users at once; users without a row are left out."""
+    user_ids = list(user_ids)[:MAX_LOOKUP]
+    if not user_ids:
+        return {}
+    placeholders = ", ".join("?" * len(user_ids))
+    async with get_db(readonly=True) as db:
+        async with db.execute(
+            f"SELECT user_id, role FROM users WHERE chat_id = ? AND user_id IN ({placeholders})",
+            (chat_id, *user_ids)
+        ) as cursor:
+            return dict(await cursor.fetchall())
+
+async def recent_members(chat_id: int, minutes: int, limit: int = MAX_LOOKUP) -> dict[int, str | None]:
+    """
+    Members who joined the chat within the last `minutes`: {user_id: username}.
+    Only join updates set joined_at, users the bot never saw joining are not included.
+    """
+    async with get_db(readonly=True) as db:
+        async with db.execute(
+            "SELECT user_id, username FROM users WHERE chat_id = ? AND joined_at >= datetime('now', ?) LIMIT ?",
+            (chat_id, f"-{int(minutes)} minutes", limit)
+        ) as cursor:
+            return dict(await cursor.fetchall())
@@ -0,0 +1,147 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.types import ChatPermissions, User
+
+import config
+from database.manager import get_db
+from database.chat_settings import get_chat_settings
+from utils.i18n import i18n
+from utils.logger import log_action
+from utils.scheduler import scheduler, ScheduledAction
+
+# Warns older than this no longer count towards the limit (0 = never expire)
+WARN_DECAY = config.WARN_DECAY_DAYS * 86400
+# Expired and punished warns are kept this long for the history, then compacted away
+WARN_HISTORY = max(config.WARN_HISTORY_DAYS * 86400, WARN_DECAY)
+WARN_COMPACT_INTERVAL = 6 * 3600  # seconds
+
+ACTIVE_WARNS_SQL = "SELECT count(*) FROM warn_events WHERE chat_id = ? AND user_id = ? AND ts >= ? AND cleared = 0"
+
+def active_since() -> float:
+    """Oldest timestamp of a warn that still counts; decay is applied at read time."""
+    return time.time() - WARN_DECAY if WARN_DECAY else 0
+
+@dataclass
+class WarnResult:
+    count: int  # warns after this one (equals limit when punished)
+    limit: int
+    punishment: str | None = None  # display name of the applied punishment
+    error: str | None = None  # set when the limit was reached but punishing failed
+
+    @property
+    def punished(self) -> bool:
+        return self.punishment is not None
+
+    def text(self, lang_code: str, name: str) -> str:
+        if self.error:
+            return i18n.get(lang_code, "error_generic", error=self.error)
+        if self.punished:
+            return i18n.get(lang_code, "msg_punish_updated", punishment=self.punishment)
+        return i18n.get(lang_code, "warn_issued", name=name, count=self.count, limit=self.limit)
+
+async def punish(bot: Bot, chat_id: int, user: User, punishment: str, lang_code: str) -> str:
+    """Applies a warn_punishment setting value and returns its display name."""
+    seconds = None
+    if punishment.startswith("ban_"):
+        # Temporary ban; a malformed value falls back to a permanent one
+        try:
+            seconds = int(punishment.split("_")[1])
+        except ValueError:
+            pass
+    if seconds:
+        until_date = datetime.now() + timedelta(seconds=seconds)
+        await bot.ban_chat_member(chat_id, user.id, until_date=until_date)
+        await scheduler.schedule("unban", chat_id, user.id, until_date, {"name": user.full_name})
+        return i18n.get(lang_code, "val_ban_temp", days=seconds // 86400)
+    if punishment == "kick":
+        await bot.unban_chat_member(chat_id, user.id)
+        return i18n.get(lang_code, "val_kick")
+    if punishment == "mute":
+        await bot.restrict_chat_member(chat_id, user.id, ChatPermissions(can_send_messages=False))
+        return i18n.get(lang_code, "val_mute")
+    await bot.ban_chat_member(chat_id, user.id)
+    return i18n.get(lang_code, "val_ban")
+
+async def add_warn(bot: Bot, chat_id: int, user: User, source: str, lang_code: str,
+                   issuer_id: int | None = None, reason: str | None = None) -> WarnResult:
+    """
+    Records one warn and escalates to the chat's warn_punishment at the limit.
+    source says where the warn came from ("manual", "censor", "antilink").
+    """
+    chat_settings = await get_chat_settings(chat_id)
+    limit, punishment = chat_settings.warn_limit, chat_settings.warn_punishment
+
+    # Insert, count and clear in one write transaction, so concurrent warns
+    # are all counted and exactly one of them reaches the limit
+    cleared_ids = []
+    async with get_db() as db:
+        await db.execute("INSERT OR IGNORE INTO users (user_id, chat_id) VALUES (?, ?)", (user.id, chat_id))
+        await db.execute(
+            "INSERT INTO warn_events (chat_id, user_id, issuer_id, source, reason, ts) VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, user.id, issuer_id, source, reason, time.time())
+        )
+        async with db.execute(ACTIVE_WARNS_SQL, (chat_id, user.id, active_since())) as cursor:
+            count = (await cursor.fetchone())[0]
+        if count >= limit:
+            async with db.execute(
+                "UPDATE warn_events SET cleared = 1 WHERE chat_id = ? AND user_id = ? AND cleared = 0 RETURNING id",
+                (chat_id, user.id)
+            ) as cursor:
+                cleared_ids = [row[0] for row in await cursor.fetchall()]
+        await db.commit()
+
+    if count < limit:
+        return WarnResult(count, limit)
+
+    try:
+        punish_name = await punish(bot, chat_id, user, punishment, lang_code)
+    except Exception as e:
+        # Give the warns back, the next one retries the punishment
+        async with get_db() as db:
+            await db.executemany("UPDATE warn_events SET cleared = 0 WHERE id = ?", [(i,) for i in cleared_ids])
+            await db.commit()
+        await log_action(bot, chat_id, "Punish Error", f"Failed to punish {user.id}: {e}")
+        return WarnResult(limit, limit, error=str(e))
+
+    await log_action(bot, chat_id, "Punishment", f"User {user.full_name} ({user.id}) reached warn limit via {source}. Punishment: {punishment}")
+    return WarnResult(limit, limit, punishment=punish_name)
+
+async def remove_warn(chat_id: int, user_id: int) -> bool:
+    """Deletes the user's most recent active warn."""
+    async with get_db() as db:
+        cursor = await db.execute("""
+            DELETE FROM warn_events WHERE id = (
+                SELECT id FROM warn_events
+                WHERE chat_id = ? AND user_id = ? AND ts >= ? AND cleared = 0
+                ORDER BY ts DESC LIMIT 1
+            )
+        """, (chat_id, user_id, active_since()))
+        removed = cursor.rowcount > 0
+        await cursor.close()
+        await db.commit()
+    return removed
+
+@scheduler.job("compact_warns")
+async def compact_warns(bot: Bot, action: ScheduledAction):
+    """Drops warns past the history window, then plans the next run."""
+    try:
+        async with get_db() as db:
+            # Warns that still count are kept whatever their age
+            cursor = await db.execute(
+                "DELETE FROM warn_events WHERE ts < ? AND (cleared = 1 OR ts < ?)",
+                (time.time() - WARN_HISTORY, active_since())
+            )
+            if cursor.rowcount:
+                logging.info(f"Compacted {cursor.rowcount} old warns")
+            await cursor.close()
+            await db.commit()
+    finally:
+        await scheduler.schedule("compact_warns", 0, 0, time.time() + WARN_COMPACT_INTERVAL)
+
+async def start_warn_compaction():
+    # Runs once shortly after startup, then every WARN_COMPACT_INTERVAL
+    await scheduler.schedule("compact_warns", 0, 0, time.time() + 60)
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import config
+
+# How long shutdown waits for updates that are still being processed
+WEBHOOK_DRAIN_TIMEOUT = 15  # seconds
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Answers Telegram right away and processes every update in its own task,
+    so slow handlers never hold up the next update.
+    On shutdown it waits for the updates already accepted instead of dropping them.
+    The bot session is left open, main() closes it after flushing logs.
+    """
+    async def close(self):
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logging.info(f"Waiting for {len(tasks)} updates to finish...")
+        done, pending = await asyncio.wait(tasks, timeout=WEBHOOK_DRAIN_TIMEOUT)
+        if pending:
+            logging.warning(f"{len(pending)} updates did not finish in time")
+
+async def run_webhook(bot: Bot, dp: Dispatcher, allowed_updates: list[str]):
+    """
+    Serves updates over HTTP until the process is interrupted.
+    Test locally by posting update JSON to http://WEBHOOK_HOST:WEBHOOK_PORT/WEBHOOK_PATH
+    with the X-Telegram-Bot-Api-Secret-Token header set to WEBHOOK_SECRET.
+    """
+    app = web.Application()
+    DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.WEBHOOK_SECRET,
+        handle_in_background=True,
+    ).register(app, path=config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT)
+    await site.start()
+    logging.info(f"Webhook server listening on {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+
+    if config.WEBHOOK_URL:
+        await bot.set_webhook(
+            url=config.WEBHOOK_URL,
+            secret_token=config.WEBHOOK_SECRET,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=allowed_updates,
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass # Windows: Ctrl+C still raises KeyboardInterrupt
+
+    try:
+        await stop.wait()
+    finally:
+        # Stops accepting requests first, then drains in-flight updates
+        await runner.cleanup()
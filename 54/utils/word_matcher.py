@@ -0,0 +1,48 @@
+import re
+
+_TOKEN_RE = re.compile(r"\w+")
+
+class WordMatcher:
+    """
+    Matches a whole list of banned words against a text in one pass.
+    Keeps the old per-word semantics of re.search(r'\\b' + re.escape(word) + r'\\b', text):
+
+    - plain words (letters/digits/_ only) are looked up in a set while
+      walking the text's word tokens, so the cost does not grow with the list
+    - everything else (phrases, words with symbols) goes into one combined regex
+    """
+
+    def __init__(self, words):
+        self.words = set()
+        phrases = []
+        for word in words:
+            if not word:
+                continue
+            if _TOKEN_RE.fullmatch(word):
+                self.words.add(word)
+            else:
+                phrases.append(word)
+
+        self.pattern = None
+        if phrases:
+            # Longest first so overlapping entries report the longest hit
+            phrases.sort(key=len, reverse=True)
+            alternation = "|".join(re.escape(p) for p in phrases)
+            self.pattern = re.compile(r"\b(?:" + alternation + r")\b")
+
+    def __bool__(self):
+        return bool(self.words) or self.pattern is not None
+
+    def search(self, text: str) -> str | None:
+        """Returns the first banned word found in the (already lowercased) text, or None."""
+        if self.words:
+            for token in _TOKEN_RE.findall(text):
+                if token in self.words:
+                    return token
+
+        if self.pattern is not None:
+            match = self.pattern.search(text)
+            if match:
+                return match.group(0)
+
+        return None